@@ -1,3 +1,6 @@
 """ansem-import: ANSEM DB一括登録CLIツール"""
 
 __version__ = "0.1.0"
+
+# 一度にメモリへ載せるCSV行数の既定値（CLIの起動時に重いモジュールを読まずに参照できるよう、ここに置く）
+CHUNK_SIZE = 5000
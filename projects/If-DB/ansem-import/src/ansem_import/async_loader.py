@@ -0,0 +1,161 @@
+"""asyncioによるパイプライン投入（psycopg AsyncConnection）
+
+読み込み・バリデーション・変換（CPU）とDB書き込み（I/O）を有界キューでつなぎ、
+次のチャンクの変換中にも書き込みが進むようにする。
+書き込みは writers 本の接続で並行に行う。関連テーブルは外部キー制約のため
+親と同じ接続（同じトランザクション）で書くが、チャンクが別の接続に振り分けられるので
+親テーブルと関連テーブルの書き込みは接続をまたいで並行に進む。
+
+各接続は全接続の書き込みが終わるまでコミットしないため、同じ一意キーの行を
+別々の接続が書くと、後の接続は先の接続のコミットを待ち続けることになる。
+lock_timeout を設定し、他の接続の行ロックを待つ書き込みは失敗させて全体を取り消す。
+"""
+
+import asyncio
+from typing import Iterable
+
+from .loader import (
+    COPY_BATCH_SIZE,
+    LoadResult,
+    _copy_sql,
+    _group_by_shape,
+    _group_indices_by_shape,
+    _insert_sql,
+)
+from .metrics import CountingCursor, StageMetrics, timed
+from .pipeline import chunked
+
+_DONE = object()
+
+# 他の接続の未コミット行を待つ上限（同じ投入内では待っても解消しない）
+LOCK_TIMEOUT = "5s"
+
+
+def load_batches_async(
+    batches: Iterable[tuple[list[dict], dict[str, list[tuple[int, dict]]]]],
+    config: dict,
+    db_url: str,
+    mode: str = "insert",
+    *,
+    with_related: bool = False,
+    writers: int = 2,
+    metrics: StageMetrics | None = None,
+) -> LoadResult:
+    """load_batches の非同期版（insert / copy のみ）
+
+    全接続の書き込みが成功してから、接続ごとに順にコミットする。書き込み中に1つでも
+    失敗すれば（一意キーの競合によるロック待ちの打ち切りを含む）どの接続もコミットしないが、
+    コミット自体が途中の接続で失敗した場合は、それより前にコミットした接続の分は残る。
+    metrics: 変換と書き込みが重なるため、投入全体の経過時間を加算する
+    """
+    metrics = metrics if metrics is not None else StageMetrics()
+    try:
+        with timed(metrics):
+            result = asyncio.run(_load(batches, config, db_url, mode, with_related, writers))
+    except ExceptionGroup as eg:
+        # 同期版と同じ例外が見えるよう、最初に失敗したタスクの例外を送出する
+        raise eg.exceptions[0] from eg
+
+    metrics.rows_in += result.count
+    metrics.rows_out += result.count
+    return result
+
+
+async def _load(batches, config, db_url, mode, with_related, writers) -> LoadResult:
+    import psycopg
+
+    result = LoadResult()
+    queue = asyncio.Queue(maxsize=writers * 2)
+    conns = [await psycopg.AsyncConnection.connect(db_url) for _ in range(writers)]
+
+    try:
+        for conn in conns:
+            await conn.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        result.round_trips += len(conns)
+
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(_produce(batches, queue, writers))
+            for conn in conns:
+                tg.create_task(_write_worker(conn, config, mode, with_related, queue, result))
+
+        for conn in conns:
+            await conn.commit()
+        result.round_trips += len(conns)
+    finally:
+        for conn in conns:
+            await conn.close()
+
+    return result
+
+
+async def _produce(batches, queue: asyncio.Queue, writers: int) -> None:
+    """同期のチャンク生成をスレッドで進め、キューへ流す（キューが満杯なら待つ）"""
+    loop = asyncio.get_running_loop()
+    it = iter(batches)
+
+    while (batch := await loop.run_in_executor(None, next, it, _DONE)) is not _DONE:
+        await queue.put(batch)
+
+    for _ in range(writers):
+        await queue.put(_DONE)
+
+
+async def _write_worker(conn, config, mode, with_related, queue, result: LoadResult) -> None:
+    """キューからチャンクを取り出し、1つの接続で書き込み続ける"""
+    table_name = config["table"]
+    foreign_keys = {rel["table"]: rel["foreign_key"] for rel in config.get("related_tables", [])}
+
+    async with conn.cursor() as raw_cur:
+        cur = CountingCursor(raw_cur)
+        while (batch := await queue.get()) is not _DONE:
+            records, related = batch
+
+            if with_related:
+                ids = await _insert_returning(cur, table_name, records, config["primary_key"])
+                result.count += len(ids)
+                for rel_table, rel_records in related.items():
+                    fk = foreign_keys[rel_table]
+                    rows = [{fk: ids[i], **record} for i, record in rel_records]
+                    written = await _copy_rows(cur, rel_table, rows)
+                    result.related[rel_table] = result.related.get(rel_table, 0) + written
+            elif mode == "copy":
+                result.count += await _copy_rows(cur, table_name, records)
+            else:
+                result.count += await _insert_rows(cur, table_name, records)
+
+        result.round_trips += cur.round_trips
+
+
+async def _insert_rows(cur, table_name: str, rows: list[dict]) -> int:
+    """非NULL列の組み合わせごとにexecutemany（パイプライン）でINSERTする"""
+    for cols, values in _group_by_shape(rows).items():
+        await cur.executemany(_insert_sql(table_name, cols), values)
+    return len(rows)
+
+
+async def _insert_returning(cur, table_name: str, records: list[dict], returning: str) -> list:
+    """loader._insert_returning の非同期版"""
+    ids = [None] * len(records)
+
+    for cols, indices in _group_indices_by_shape(records).items():
+        sql = _insert_sql(table_name, cols) + f" RETURNING {returning}"
+        await cur.executemany(sql, [tuple(records[i][c] for c in cols) for i in indices], returning=True)
+        for i in indices:
+            ids[i] = (await cur.fetchone())[0]
+            cur.nextset()
+
+    return ids
+
+
+async def _copy_rows(cur, table_name: str, rows: list[dict]) -> int:
+    """loader._copy_rows の非同期版"""
+    count = 0
+
+    for batch in chunked(rows, COPY_BATCH_SIZE):
+        for cols, values in _group_by_shape(batch).items():
+            async with cur.copy(_copy_sql(table_name, cols)) as copy:
+                for value in values:
+                    await copy.write_row(value)
+            count += len(values)
+
+    return count
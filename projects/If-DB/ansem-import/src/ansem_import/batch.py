@@ -0,0 +1,172 @@
+"""複数ファイルの一括インポート（import-batch）
+
+マニフェストでファイル名パターンとテーブルを対応づけ、対象ファイルを並行して取り込む。
+接続はプール（psycopg_pool）から借り、テーブル定義はテーブルごとに1回だけ読み込む。
+ファイルごとに1トランザクションで投入し、失敗したファイルだけがロールバックされる。
+
+マニフェストの例:
+    files:
+      - pattern: "influencers_*.csv"
+        table: influencers
+"""
+
+import fnmatch
+import glob
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .dedup import DedupIndex, dedup_columns
+from .errors import ErrorCollector
+from .loader import load_batches
+from .lookup import LookupResolver, lookup_columns
+from .pipeline import CHUNK_SIZE, PipelineStats, check_file, iter_batches
+from .tabledef import TableDef
+
+
+class ManifestError(Exception):
+    """マニフェストの形式が不正"""
+
+
+@dataclass
+class FileResult:
+    """1ファイル分の取り込み結果"""
+
+    path: str
+    table: str
+    status: str = "pending"  # loaded / invalid / failed
+    rows_read: int = 0
+    rows_valid: int = 0
+    loaded: int = 0
+    related: dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    seconds: float = 0.0
+    message: str = ""
+
+
+def load_manifest(path) -> list[tuple[str, str]]:
+    """マニフェストYAMLを [(ファイル名パターン, テーブル名), ...] にする"""
+    import yaml
+
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+
+    entries = data.get("files") if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise ManifestError(f"{path}: files にパターンとテーブルの一覧が必要です")
+    for entry in entries:
+        if not isinstance(entry, dict) or "pattern" not in entry or "table" not in entry:
+            raise ManifestError(f"{path}: files の各要素には pattern と table が必要です: {entry}")
+    return [(entry["pattern"], entry["table"]) for entry in entries]
+
+
+def resolve_files(source: str, manifest: list[tuple[str, str]]) -> tuple[list[tuple[Path, str]], list[Path]]:
+    """ディレクトリまたはglobから対象ファイルを集め、マニフェストでテーブルを決める
+
+    戻り値: ([(ファイル, テーブル名), ...], どのパターンにも一致しなかったファイル)
+    パターンはファイル名に対して上から順に照合し、最初に一致したものを使う。
+    """
+    source_path = Path(source)
+    if source_path.is_dir():
+        candidates = sorted(p for p in source_path.iterdir() if p.is_file())
+    else:
+        candidates = sorted(Path(p) for p in glob.glob(source) if Path(p).is_file())
+
+    matched, unmatched = [], []
+    for path in candidates:
+        table = next((t for pattern, t in manifest if fnmatch.fnmatch(path.name, pattern)), None)
+        if table is None:
+            unmatched.append(path)
+        else:
+            matched.append((path, table))
+    return matched, unmatched
+
+
+def run_batch(
+    files: list[tuple[Path, str]],
+    table_defs: dict[str, TableDef],
+    db_url: str,
+    *,
+    jobs: int = 2,
+    load_mode: str = "insert",
+    skip_errors: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    on_done=None,
+) -> list[FileResult]:
+    """ファイルをjobs本のスレッドで並行して取り込む（結果はfilesと同じ順）
+
+    on_done: 1ファイル終わるたびに on_done(FileResult) を呼ぶ（進捗表示用）
+    """
+    from psycopg_pool import ConnectionPool
+
+    results = [FileResult(path=str(path), table=table) for path, table in files]
+    lock = threading.Lock()
+
+    def work(i):
+        path, table = files[i]
+        result = results[i]
+        _import_file(pool, path, table_defs[table], db_url, load_mode, skip_errors, chunk_size, result)
+        if on_done:
+            with lock:
+                on_done(result)
+
+    with ConnectionPool(db_url, min_size=1, max_size=jobs, open=True) as pool:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(work, range(len(files))))
+
+    return results
+
+
+def _import_file(pool, path, table_def, db_url, load_mode, skip_errors, chunk_size, result: FileResult) -> None:
+    """1ファイルを取り込み、結果を result に書き込む（例外は外に出さない）"""
+    config = table_def.config
+    errors = ErrorCollector(samples=1)
+    stats = PipelineStats()
+    started = time.perf_counter()
+
+    lookups = LookupResolver(config, db_url) if lookup_columns(config) else None
+
+    try:
+        if not skip_errors:
+            check_file(
+                path, config, errors, stats, chunk_size,
+                plan=table_def.plan, dedup=_dedup_index(config), lookups=lookups,
+            )
+            result.rows_read, result.rows_valid, result.errors = stats.rows_read, stats.rows_valid, len(errors)
+            if errors:
+                result.status = "invalid"
+                first = errors.summary()[0]
+                result.message = f"行{first.rows[0]}: {first.first_message}" + (f" ほか{len(errors) - 1}件" if len(errors) > 1 else "")
+                return
+            stats = PipelineStats()
+
+        batches = iter_batches(
+            path, config, errors, stats, chunk_size,
+            plan=table_def.plan, dedup=_dedup_index(config), lookups=lookups,
+        )
+
+        with pool.connection() as conn:
+            loaded = load_batches(
+                batches, config, db_url, load_mode,
+                with_related=bool(config.get("related_tables")),
+                conn=conn,
+            )
+        result.status = "loaded"
+        result.loaded = loaded.count
+        result.related = loaded.related
+        result.rows_read, result.rows_valid, result.errors = stats.rows_read, stats.rows_valid, len(errors)
+    except Exception as e:  # 1ファイルの失敗で他のファイルを止めない
+        result.status = "failed"
+        result.message = f"{type(e).__name__}: {e}"
+    finally:
+        if lookups is not None:
+            lookups.close()
+        result.seconds = time.perf_counter() - started
+
+
+def _dedup_index(config: dict) -> DedupIndex | None:
+    """ファイル内の重複検出用の索引（ファイルごとに作り直す）"""
+    key_defs = dedup_columns(config)
+    return DedupIndex(key_defs) if key_defs else None
@@ -0,0 +1,232 @@
+"""取り込み性能ベンチマーク
+
+テーブル定義YAMLから合成CSVを生成し、取り込みの各段階
+（読み込み / バリデーション / 変換 / SQL生成・投入）を個別に計測する。
+DB接続先を指定しない場合は、何もしないスタブカーソルで投入処理のPython側コストを測る。
+"""
+
+import csv
+import random
+import resource
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from .loader import LoadResult, _make_writer, generate_sql, load_batches
+from .pipeline import CHUNK_SIZE, chunked, read_chunks
+from .transformer import transform_related, transform_rows
+from .validator import compile_plan, validate_csv
+
+_INVALID_VALUES = {
+    "email": "invalid-email",
+    "digits": "12ab",
+    "dropdown": "（不正な値）",
+    "required": "",
+}
+
+
+@dataclass
+class StageResult:
+    """1段階分の計測結果"""
+
+    stage: str
+    seconds: float
+    rows: int
+    peak_rss_mb: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def generate_csv(
+    config: dict,
+    path,
+    rows: int,
+    error_rate: float = 0.0,
+    dropdown_weights: dict[str, dict[str, float]] | None = None,
+    seed: int | None = None,
+) -> int:
+    """テーブル定義に沿った合成CSVを書き出す
+
+    error_rate: バリデーションエラーを1つ仕込む行の割合
+    dropdown_weights: CSV列名 → {選択肢: 重み}（省略した列は一様）
+    戻り値: エラーを仕込んだ行数
+    """
+    rng = random.Random(seed)
+    col_defs = list(config["columns"])
+    for rel in config.get("related_tables", []):
+        col_defs.extend(rel["columns"])
+    header = list(dict.fromkeys(c["csv"] for c in col_defs))
+    breakable = [c for c in col_defs if _error_kind(c)]
+    dropdown_weights = dropdown_weights or {}
+    n_errors = 0
+
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+
+        for i in range(rows):
+            row = {c["csv"]: _synthetic_value(c, i, rng, dropdown_weights) for c in col_defs}
+            if breakable and rng.random() < error_rate:
+                col_def = rng.choice(breakable)
+                row[col_def["csv"]] = _INVALID_VALUES[_error_kind(col_def)]
+                n_errors += 1
+            writer.writerow([row[h] for h in header])
+
+    return n_errors
+
+
+def run_benchmark(
+    config: dict,
+    csv_path,
+    db_url: str | None = None,
+    load_mode: str = "insert",
+    chunk_size: int = CHUNK_SIZE,
+) -> list[StageResult]:
+    """CSVを段階ごとに全件処理して計測する（段階間は全件をメモリに保持）"""
+    results = []
+
+    with _measure("read", results) as stage:
+        header = None
+        rows = []
+        for _, chunk, header in read_chunks(csv_path, chunk_size):
+            rows.extend(chunk)
+        stage.rows = len(rows)
+
+    with _measure("validate_csv", results) as stage:
+        valid, _ = validate_csv(rows, config, plan=compile_plan(config), header=header)
+        stage.rows = len(rows)
+
+    with _measure("transform_rows", results) as stage:
+        records = transform_rows(valid, config, header)
+        related = transform_related(valid, config, header)
+        stage.rows = len(valid)
+
+    with _measure("generate_sql", results) as stage:
+        generate_sql(records, config)
+        stage.rows = len(records)
+
+    with_related = bool(config.get("related_tables"))
+    batches = _rebatch(records, related, chunk_size)
+    label = f"load [{load_mode}]" if db_url else f"load [{load_mode}, stub]"
+    with _measure(label, results) as stage:
+        if db_url:
+            result = load_batches(batches, config, db_url, load_mode, with_related=with_related)
+        else:
+            result = LoadResult()
+            write = _make_writer(_StubCursor(), config, load_mode, with_related, False)
+            for batch_records, batch_related in batches:
+                write(batch_records, batch_related, result)
+        stage.rows = result.count
+
+    return results
+
+
+def format_results(results: list[StageResult]) -> str:
+    """計測結果を表形式の文字列にする"""
+    lines = [f"{'stage':<32} {'seconds':>9} {'rows':>10} {'rows/s':>12} {'peak RSS':>10}"]
+    for r in results:
+        lines.append(
+            f"{r.stage:<32} {r.seconds:>9.3f} {r.rows:>10,} {r.rows_per_sec:>12,.0f}"
+            f" {r.peak_rss_mb:>8.1f}MB"
+        )
+    return "\n".join(lines)
+
+
+def parse_dropdown_weights(specs: tuple[str, ...]) -> dict[str, dict[str, float]]:
+    """ "列名=選択肢:重み,選択肢:重み" 形式の指定を辞書にする"""
+    weights = {}
+    for spec in specs:
+        column, _, choices = spec.partition("=")
+        weights[column] = {
+            choice: float(weight)
+            for choice, _, weight in (item.rpartition(":") for item in choices.split(","))
+        }
+    return weights
+
+
+@contextmanager
+def _measure(stage: str, results: list[StageResult]):
+    result = StageResult(stage=stage, seconds=0.0, rows=0, peak_rss_mb=0.0)
+    started = time.perf_counter()
+    yield result
+    result.seconds = time.perf_counter() - started
+    result.peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KB
+    results.append(result)
+
+
+def _rebatch(records: list[dict], related: dict[str, list[tuple[int, dict]]], size: int):
+    """全件の変換結果を、投入処理が受け取るチャンク単位に区切り直す"""
+    by_chunk: dict[int, dict[str, list[tuple[int, dict]]]] = {}
+    for rel_table, rel_records in related.items():
+        for i, record in rel_records:
+            by_chunk.setdefault(i // size, {}).setdefault(rel_table, []).append((i % size, record))
+
+    for n, chunk in enumerate(chunked(records, size)):
+        yield chunk, by_chunk.get(n, {})
+
+
+def _error_kind(col_def: dict) -> str | None:
+    fmt = col_def.get("format") or ""
+    if fmt == "email":
+        return "email"
+    if fmt.startswith("digits:"):
+        return "digits"
+    if col_def.get("type") == "dropdown":
+        return "dropdown"
+    if col_def.get("required"):
+        return "required"
+    return None
+
+
+def _synthetic_value(col_def: dict, i: int, rng: random.Random, dropdown_weights: dict) -> str:
+    fmt = col_def.get("format") or ""
+    col_type = col_def.get("type")
+
+    if col_type in ("dropdown", "boolean"):
+        choices = list(col_def["mapping"])
+        weights = dropdown_weights.get(col_def["csv"])
+        if weights:
+            return rng.choices(list(weights), weights=list(weights.values()))[0]
+        return rng.choice(choices)
+    if fmt == "email":
+        return f"user{i}@example.com"
+    if fmt.startswith("digits:"):
+        length = int(fmt.split(":")[1])
+        return "".join(rng.choice("0123456789") for _ in range(length))
+    return f"{col_def['csv']}{i}"
+
+
+class _StubCursor:
+    """DBに送らずに投入処理を回すためのカーソル"""
+
+    def __init__(self):
+        self._next_id = 0
+        self._pending = 0  # generate_series で採番を頼まれた件数（次の fetchall で返す）
+
+    def execute(self, sql, params=None):
+        self._pending = params[1] if "generate_series" in sql else 0
+
+    def executemany(self, sql, params_seq, returning=False):
+        pass
+
+    def fetchall(self):
+        rows = [(self._next_id + i,) for i in range(1, self._pending + 1)]
+        self._next_id += self._pending
+        self._pending = 0
+        return rows
+
+    def fetchone(self):
+        self._next_id += 1
+        return (self._next_id,)
+
+    def nextset(self):
+        return None
+
+    @contextmanager
+    def copy(self, sql):
+        yield self
+
+    def write_row(self, row):
+        pass
@@ -0,0 +1,67 @@
+"""再開用チェックポイント（--commit-every / --resume）
+
+コミット済みの位置をCSVと同じディレクトリの `<CSV名>.checkpoint.json` に記録する。
+CSVの内容ハッシュも持つため、ファイルが差し替えられていれば再開しない。
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class CheckpointMismatch(Exception):
+    """チェックポイントが別のファイル・テーブルのもの"""
+
+
+def checkpoint_path(filepath) -> Path:
+    path = Path(filepath)
+    return path.with_name(path.name + CHECKPOINT_SUFFIX)
+
+
+def file_hash(filepath) -> str:
+    """ファイル内容のSHA-256"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        while block := f.read(_HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_checkpoint(filepath, table: str, content_hash: str) -> int:
+    """コミット済みのデータ行数を返す（チェックポイントがなければ0）"""
+    path = checkpoint_path(filepath)
+    if not path.exists():
+        return 0
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    if data["sha256"] != content_hash or data["table"] != table:
+        raise CheckpointMismatch(
+            f"チェックポイント {path} は別の内容・テーブルのものです（table={data['table']}）"
+        )
+    return data["rows_done"]
+
+
+def save_checkpoint(filepath, table: str, content_hash: str, rows_done: int) -> None:
+    """コミット済みの位置を記録する（一時ファイル経由で置き換え）"""
+    path = checkpoint_path(filepath)
+    data = {
+        "source": str(Path(filepath).resolve()),
+        "sha256": content_hash,
+        "table": table,
+        "rows_done": rows_done,
+        "last_row": rows_done + 1,  # ヘッダーが1行目のため
+    }
+
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    tmp.replace(path)
+
+
+def clear_checkpoint(filepath) -> None:
+    checkpoint_path(filepath).unlink(missing_ok=True)
@@ -1,18 +1,19 @@
-"""CLIエントリポイント"""
+"""CLIエントリポイント
+
+--help / --version を速く返すため、モジュールの読み込み時は click だけを import し、
+処理本体（yaml / csv / psycopg 等を使うモジュール）は各コマンドの実行時に読み込む。
+"""
 
 import sys
-from pathlib import Path
+import time
 
 import click
-import yaml
 
-from .validator import validate_csv
-from .transformer import transform_rows
-from .loader import generate_sql, execute_insert
+from . import CHUNK_SIZE, __version__
 
 
 @click.group()
-@click.version_option()
+@click.version_option(__version__, package_name="ansem-import")
 def main():
     """ANSEM DB一括登録CLIツール"""
     pass
@@ -20,76 +21,641 @@ def main():
 
 @main.command()
 @click.option("--table", "-t", required=True, help="対象テーブル名（例: influencers）")
-@click.option("--file", "-f", "filepath", required=True, type=click.Path(exists=True), help="CSVファイルパス")
+@click.option(
+    "--file", "-f", "filepath", required=True, type=click.Path(exists=True),
+    help="CSVファイルパス（.parquet / .arrow も可、要 pyarrow）",
+)
 @click.option("--dry-run", is_flag=True, help="SQL出力のみ（DB変更なし）")
 @click.option("--skip-errors", is_flag=True, help="エラー行をスキップして続行")
-@click.option("--report", type=click.Path(), help="エラーレポートの出力先")
+@click.option("--report", type=click.Path(), help="エラーレポート（全件の明細CSV）の出力先")
+@click.option(
+    "--max-errors",
+    type=click.IntRange(min=0),
+    help="バリデーションエラーがこの件数を超えたら中断する",
+)
 @click.option("--verbose", "-v", is_flag=True, help="詳細ログ出力")
 @click.option("--db-url", envvar="ANSEM_DATABASE_URL", help="PostgreSQL接続URL")
-def import_data(table, filepath, dry_run, skip_errors, report, verbose, db_url):
+@click.option(
+    "--load-mode",
+    type=click.Choice(["insert", "copy", "prepared", "staging"]),
+    default="insert",
+    show_default=True,
+    help="投入方式（copy: COPY FROM STDINで一括投入、prepared: 列を固定したプリペアド文をまとめて送信、"
+    "staging: 一時表へCOPYしてDB内でまとめて検査・変換）",
+)
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=CHUNK_SIZE,
+    show_default=True,
+    help="一度にメモリへ載せるCSV行数",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="バリデーション・変換の並列プロセス数",
+)
+@click.option(
+    "--sql-batch-size",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="DRY RUN時に1つのINSERT文へまとめる行数",
+)
+@click.option(
+    "--sql-output", "-o",
+    type=click.Path(dir_okay=False),
+    help="DRY RUNのSQLを端末ではなくファイルへ書き出す（psql -f で再実行可能）",
+)
+@click.option("--upsert", is_flag=True, help="natural_keyが一致する行は更新（INSERT ... ON CONFLICT）")
+@click.option("--diff-only", is_flag=True, help="既存行と内容を比較し、変更のある行だけ書き込む（--upsertを含む）")
+@click.option(
+    "--commit-every",
+    type=click.IntRange(min=1),
+    help="N行ごとにコミットし、チェックポイントを記録する（既定: 全体で1トランザクション）",
+)
+@click.option("--resume", is_flag=True, help="チェックポイントからコミット済みの行を飛ばして再開")
+@click.option(
+    "--dedup-existing",
+    is_flag=True,
+    help="dedup_key が投入先テーブルの既存データと重複する行もエラーにする",
+)
+@click.option(
+    "--async-writers",
+    type=click.IntRange(min=1),
+    help="asyncioで変換と書き込みを並行させ、N本の接続で書き込む（insert/copyのみ。"
+    "コミットは全接続の書き込み後に接続ごとに行う）",
+)
+@click.option(
+    "--db-connections",
+    type=click.IntRange(min=1),
+    help="N本の接続でステージング表へCOPYし、最後に1トランザクションで本表へ移す",
+)
+@click.option(
+    "--audit-parquet",
+    type=click.Path(dir_okay=False),
+    help="変換後のレコードをParquetに書き出す（監査用、要 pyarrow）",
+)
+@click.option(
+    "--lookup-cache",
+    type=click.Path(file_okay=False),
+    help="lookup列のマスタ参照結果をこのディレクトリにキャッシュする",
+)
+@click.option(
+    "--lookup-ttl",
+    type=click.IntRange(min=0),
+    default=86400,
+    show_default=True,
+    help="--lookup-cache の有効期間（秒）",
+)
+@click.option("--force", is_flag=True, help="投入済みの台帳にあるファイルも投入する")
+@click.option(
+    "--ledger",
+    envvar="ANSEM_IMPORT_LEDGER",
+    type=click.Path(dir_okay=False),
+    help="投入済みファイルの台帳（既定: $XDG_STATE_HOME/ansem-import/ledger.sqlite3）",
+)
+@click.option("--no-schema-check", is_flag=True, help="投入前のテーブル定義とDBスキーマの照合を行わない")
+@click.option(
+    "--metrics",
+    "metrics_format",
+    type=click.Choice(["json"]),
+    help="段階ごとの時間・件数・メモリ・DB往復回数を出力する",
+)
+@click.option(
+    "--metrics-out",
+    type=click.Path(dir_okay=False),
+    help="--metrics の出力先ファイル（省略時は標準エラー出力）",
+)
+def import_data(
+    table, filepath, dry_run, skip_errors, report, max_errors, verbose, db_url, load_mode, chunk_size, workers,
+    upsert, diff_only, sql_batch_size, sql_output, commit_every, resume, dedup_existing, async_writers,
+    db_connections, audit_parquet, lookup_cache, lookup_ttl, force, ledger, no_schema_check, metrics_format,
+    metrics_out,
+):
     """CSVファイルからデータをインポート"""
+    started_wall, started_cpu = time.perf_counter(), time.process_time()
 
-    # 1. テーブル定義YAMLの読み込み
-    tables_dir = Path(__file__).parent.parent.parent / "tables"
-    config_path = tables_dir / f"{table}.yaml"
-    if not config_path.exists():
-        click.echo(f"エラー: テーブル定義 {config_path} が見つかりません", err=True)
-        sys.exit(1)
+    from .checkpoint import CheckpointMismatch, clear_checkpoint, file_hash, load_checkpoint, save_checkpoint
+    from .dedup import DedupIndex, dedup_columns, fetch_existing_keys
+    from .errors import ErrorCollector, TooManyErrors
+    from .loader import MissingSequence, iter_sql, load_batches, write_sql
+    from .ledger import ImportLedger, LedgerEntry, now_iso, table_def_hash
+    from .lookup import LookupResolver, lookup_columns
+    from .metrics import StageMetrics, peak_rss_mb
+    from .pipeline import PipelineStats, check_file, iter_batches
 
-    with open(config_path) as f:
-        config = yaml.safe_load(f)
+    # 1. テーブル定義の読み込み（コンパイル済みキャッシュがあればYAMLを解析しない）
+    table_def = _load_table_def(table)
+    config = table_def.config
 
     if verbose:
         click.echo(f"テーブル定義: {config['display_name']} ({config['table']})")
 
-    # 2. CSV読み込み
-    import csv
-    with open(filepath, encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-
-    click.echo(f"CSV読み込み: {len(rows)}行")
-
-    # 3. バリデーション
-    valid_rows, errors = validate_csv(rows, config)
-    if errors:
-        click.echo(f"\n⚠️  バリデーションエラー: {len(errors)}件")
-        for err in errors:
-            click.echo(f"  行{err['row']}: {err['message']}")
-        if report:
-            _write_error_report(errors, report)
-            click.echo(f"エラーレポート: {report}")
-        if not skip_errors and errors:
+    # 投入済みの台帳にあれば、ファイルの解析・検査もDBへの接続もせずに終わる
+    import_ledger = table_hash = None
+    if not dry_run and db_url:
+        import_ledger, table_hash = ImportLedger(ledger), table_def_hash(config)
+        entry = None if force else import_ledger.find(filepath, table_hash, db_url)
+        if entry:
+            click.echo(
+                f"スキップ: {filepath} は {entry.imported_at} に {entry.table_name} へ投入済みです"
+                f"（{entry.rows_loaded}件、{entry.seconds:.2f}秒）。再投入するには --force を指定してください"
+            )
+            return
+
+    # テーブル定義をDBスキーマと照合し、列名・型・NOT NULLの誤りは行を読む前に止める
+    if not dry_run and db_url and not no_schema_check:
+        if not _check_schema(config, db_url, verbose=verbose):
+            click.echo("エラー: テーブル定義がDBスキーマと一致しません（--no-schema-check で省略可）", err=True)
+            sys.exit(1)
+
+    upsert = upsert or diff_only
+    if upsert and not config.get("natural_key"):
+        click.echo("エラー: --upsert にはテーブル定義の natural_key が必要です", err=True)
+        sys.exit(1)
+    if async_writers and (upsert or commit_every or load_mode == "prepared"):
+        click.echo(
+            "エラー: --async-writers は --upsert / --commit-every / --load-mode prepared と併用できません", err=True
+        )
+        sys.exit(1)
+    if db_connections and (upsert or commit_every or async_writers or load_mode == "prepared"):
+        click.echo(
+            "エラー: --db-connections は --upsert / --commit-every / --async-writers / --load-mode prepared"
+            " と併用できません",
+            err=True,
+        )
+        sys.exit(1)
+    staged = load_mode == "staging" and not dry_run
+    if staged and (upsert or commit_every or resume or async_writers or db_connections or audit_parquet):
+        click.echo(
+            "エラー: --load-mode staging は --upsert / --commit-every / --resume / --async-writers"
+            " / --db-connections / --audit-parquet と併用できません",
+            err=True,
+        )
+        sys.exit(1)
+
+    # 重複検出（dedup_key / natural_key がある場合はファイル内の重複を常に検出する）
+    key_defs = dedup_columns(config)
+    existing_keys = None
+    if dedup_existing:
+        if not key_defs or upsert or not db_url:
+            click.echo(
+                "エラー: --dedup-existing には dedup_key と --db-url が必要です（--upsert とは併用不可）",
+                err=True,
+            )
+            sys.exit(1)
+        if not staged:
+            existing_keys = fetch_existing_keys(config, key_defs, db_url)
+        if verbose and existing_keys is not None:
+            click.echo(f"既存キー: {len(existing_keys)}件")
+
+    # 2. 再開位置の決定（--commit-every / --resume）
+    skip_rows = 0
+    content_hash = None
+    if not dry_run and (commit_every or resume):
+        content_hash = file_hash(filepath)
+    if not dry_run and resume:
+        try:
+            skip_rows = load_checkpoint(filepath, table, content_hash)
+        except CheckpointMismatch as e:
+            click.echo(f"エラー: {e}", err=True)
+            sys.exit(1)
+        if skip_rows:
+            click.echo(f"チェックポイントから再開: {skip_rows}行は投入済みのためスキップ")
+
+    # lookup列はマスタをチャンク単位でまとめて引き、マスタにない名前はバリデーションエラーにする
+    lookups = None
+    if lookup_columns(config):
+        if not db_url:
+            click.echo("エラー: lookup列の解決には --db-url または ANSEM_DATABASE_URL が必要です", err=True)
+            sys.exit(1)
+        lookups = LookupResolver(config, db_url, lookup_cache, lookup_ttl)
+        click.get_current_context().call_on_close(lookups.close)
+
+    # 3. バリデーション（エラー時は投入前に止めるため、先に全行を検査）
+    # エラーは列・内容ごとに集計し、明細は --report へ逐次書き出す
+    errors = ErrorCollector(report, max_errors)
+    click.get_current_context().call_on_close(errors.close)
+    stats = PipelineStats()
+    precheck_stats = None
+    if not skip_errors and not staged:
+        try:
+            check_file(
+                filepath, config, errors, stats, chunk_size, workers, skip_rows, table_def.plan,
+                dedup=DedupIndex(key_defs, existing_keys) if key_defs else None,
+                lookups=lookups,
+            )
+        except TooManyErrors as e:
+            _report_errors(errors, report)
+            click.echo(f"\nエラー: {e}（{stats.rows_read}行まで検査）", err=True)
+            sys.exit(1)
+        click.echo(f"CSV読み込み: {stats.rows_read}行")
+        if errors:
+            _report_errors(errors, report)
             click.echo("\n--skip-errors で続行可能")
             sys.exit(1)
+        click.echo(f"バリデーション通過: {stats.rows_valid}行")
+        precheck_stats, stats = stats, PipelineStats()
 
-    click.echo(f"バリデーション通過: {len(valid_rows)}行")
+    # 4. 読み込み → バリデーション → 変換（名前→ID等）をチャンク単位で流す
+    batches = iter_batches(
+        filepath, config, errors, stats, chunk_size, workers, skip_rows, table_def.plan,
+        dedup=DedupIndex(key_defs, existing_keys) if key_defs else None,
+        lookups=lookups,
+    )
+    related_counts = {}
+    load_metrics = StageMetrics()
+    round_trips = 0
 
-    # 4. 変換（名前→ID等）
-    transformed = transform_rows(valid_rows, config)
+    if audit_parquet:
+        from .columnar import write_parquet_audit
+
+        batches = write_parquet_audit(batches, config, audit_parquet)
 
     # 5. SQL生成 or DB投入
-    if dry_run:
-        click.echo("\n--- DRY RUN ---")
-        sql_statements = generate_sql(transformed, config)
-        for stmt in sql_statements:
-            click.echo(stmt)
-        click.echo(f"\n合計: {len(sql_statements)}件のINSERT文")
+    try:
+        if dry_run:
+            click.echo("\n--- DRY RUN ---")
+            statements = iter_sql(_collect_related(batches, related_counts), config, sql_batch_size)
+            if sql_output:
+                count = write_sql(statements, sql_output)
+                click.echo(f"SQL出力: {sql_output}")
+            else:
+                count = 0
+                for stmt in statements:
+                    click.echo(stmt)
+                    count += 1
+            click.echo(f"\n合計: {count}件のINSERT文")
+        else:
+            if not db_url:
+                click.echo("エラー: --db-url または ANSEM_DATABASE_URL が必要です", err=True)
+                sys.exit(1)
+            with_related = bool(config.get("related_tables")) and not upsert
+            if upsert and config.get("related_tables"):
+                click.echo("※ --upsert 時は関連テーブルを投入しません")
+
+            def on_commit(result):
+                save_checkpoint(filepath, table, content_hash, skip_rows + stats.rows_read)
+                if verbose:
+                    click.echo(f"  コミット: {skip_rows + stats.rows_read}行まで投入済み")
+
+            started = time.perf_counter()
+            if async_writers:
+                from .async_loader import load_batches_async
+
+                result = load_batches_async(
+                    batches, config, db_url, load_mode,
+                    with_related=with_related,
+                    writers=async_writers,
+                    metrics=load_metrics,
+                )
+            elif staged:
+                from .staging import load_staged
+
+                result = load_staged(
+                    filepath, config, db_url, errors, stats,
+                    chunk_size=chunk_size,
+                    with_related=with_related,
+                    skip_errors=skip_errors,
+                    dedup_existing=dedup_existing,
+                    metrics=load_metrics,
+                )
+                if errors and not skip_errors:
+                    click.echo(f"CSV読み込み: {stats.rows_read}行")
+                    _report_errors(errors, report)
+                    click.echo("\n--skip-errors で続行可能")
+                    sys.exit(1)
+            elif db_connections:
+                from .sharded_loader import load_batches_sharded
+
+                result = load_batches_sharded(
+                    batches, config, db_url,
+                    with_related=with_related,
+                    connections=db_connections,
+                    metrics=load_metrics,
+                )
+            else:
+                result = load_batches(
+                    batches, config, db_url,
+                    "upsert" if upsert else load_mode,
+                    with_related=with_related,
+                    diff_only=diff_only,
+                    commit_every=commit_every,
+                    on_commit=on_commit if commit_every else None,
+                    metrics=load_metrics,
+                )
+            count = result.count
+            round_trips = result.round_trips
+            related_counts = result.related
+            if commit_every or resume:
+                clear_checkpoint(filepath)
+            if diff_only:
+                click.echo(f"変更なしでスキップ: {result.skipped}件")
+            elapsed = time.perf_counter() - started
+            click.echo(f"\n✅ {count}件を {config['table']} に投入しました")
+            click.echo(f"投入時間: {elapsed:.2f}秒（{_rows_per_sec(count, elapsed):,.0f}行/秒）")
+            import_ledger.record(filepath, table_hash, db_url, LedgerEntry(
+                path=str(filepath),
+                table_name=config["table"],
+                rows_read=stats.rows_read,
+                rows_loaded=count,
+                errors=len(errors),
+                seconds=round(time.perf_counter() - started_wall, 3),
+                imported_at=now_iso(),
+            ))
+    except TooManyErrors as e:
+        _report_errors(errors, report)
+        if dry_run:
+            note = "SQLは途中までしか出力されていません"
+        elif commit_every:
+            note = "コミット済みの行は投入されたままです。--resume で続きから再開できます"
+        else:
+            note = "未コミットの投入は取り消されました"
+        click.echo(f"\nエラー: {e}（{note}）", err=True)
+        sys.exit(1)
+    except MissingSequence as e:
+        click.echo(f"\nエラー: {e}", err=True)
+        sys.exit(1)
+
+    for rel_table, rel_count in related_counts.items():
+        click.echo(f"  関連テーブル {rel_table}: {rel_count}件")
+
+    # --skip-errors 時はストリーミング中に集めたエラーを最後に報告
+    if skip_errors:
+        click.echo(f"CSV読み込み: {stats.rows_read}行 / バリデーション通過: {stats.rows_valid}行")
+        if errors:
+            _report_errors(errors, report)
+
+    if metrics_format:
+        metrics = {
+            "table": config["table"],
+            "file": str(filepath),
+            "dry_run": dry_run,
+            "total": {
+                "wall_sec": round(time.perf_counter() - started_wall, 6),
+                "cpu_sec": round(time.process_time() - started_cpu, 6),
+            },
+            "rows": {
+                "read": stats.rows_read,
+                "valid": stats.rows_valid,
+                "errors": len(errors),
+                "loaded": None if dry_run else count,
+            },
+            "stages": {
+                "decode": stats.decode.as_dict(),
+                "validate": stats.validate.as_dict(),
+                "transform": stats.transform.as_dict(),
+                "load": None if dry_run else load_metrics.as_dict(),
+            },
+            "precheck": precheck_stats and {
+                "decode": precheck_stats.decode.as_dict(),
+                "validate": precheck_stats.validate.as_dict(),
+            },
+            "db_round_trips": round_trips + (lookups.queries if lookups else 0),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        _write_metrics(metrics, metrics_out)
+
+
+@main.command()
+@click.option("--table", "-t", required=True, help="対象テーブル名（例: influencers）")
+@click.option("--rows", "-n", type=click.IntRange(min=1), default=100000, show_default=True, help="生成する行数")
+@click.option("--error-rate", type=click.FloatRange(0, 1), default=0.0, show_default=True, help="エラー行の割合")
+@click.option(
+    "--dropdown", "dropdown_specs", multiple=True,
+    help="ドロップダウンの分布（例: 区分=事務所所属:7,フリーランス:2,企業専属:1）",
+)
+@click.option("--seed", type=int, help="乱数シード")
+@click.option("--csv-out", type=click.Path(dir_okay=False), help="生成したCSVを残す場合の保存先")
+@click.option("--db-url", help="使い捨てのPostgreSQL接続URL（省略時はスタブ接続で計測）")
+@click.option(
+    "--load-mode",
+    type=click.Choice(["insert", "copy", "prepared"]),
+    default="insert",
+    show_default=True,
+    help="投入方式",
+)
+@click.option("--chunk-size", type=click.IntRange(min=1), default=CHUNK_SIZE, show_default=True)
+def bench(table, rows, error_rate, dropdown_specs, seed, csv_out, db_url, load_mode, chunk_size):
+    """合成CSVで取り込みの各段階を計測する（--db-url 指定時は実際に投入されます）"""
+    import tempfile
+    from pathlib import Path
+
+    from .bench import format_results, generate_csv, parse_dropdown_weights, run_benchmark
+
+    config = _load_table_def(table).config
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = csv_out or Path(tmp) / f"{table}_bench.csv"
+        n_errors = generate_csv(
+            config, csv_path, rows, error_rate, parse_dropdown_weights(dropdown_specs), seed
+        )
+        click.echo(f"合成CSV: {rows}行（エラー行 {n_errors}件）")
+        if csv_out:
+            click.echo(f"保存先: {csv_out}")
+
+        results = run_benchmark(config, csv_path, db_url, load_mode, chunk_size)
+
+    click.echo(format_results(results))
+
+
+@main.command("import-batch")
+@click.argument("source")
+@click.option("--manifest", "-m", required=True, type=click.Path(exists=True, dir_okay=False), help="ファイル名パターンとテーブルの対応（YAML）")
+@click.option("--db-url", envvar="ANSEM_DATABASE_URL", required=True, help="PostgreSQL接続URL")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=2, show_default=True, help="並行して取り込むファイル数（接続プールの上限）")
+@click.option("--skip-errors", is_flag=True, help="エラー行をスキップして続行")
+@click.option(
+    "--load-mode",
+    type=click.Choice(["insert", "copy", "prepared"]),
+    default="insert",
+    show_default=True,
+    help="投入方式",
+)
+@click.option("--chunk-size", type=click.IntRange(min=1), default=CHUNK_SIZE, show_default=True)
+@click.option("--summary", type=click.Path(dir_okay=False), help="ファイルごとの結果をCSVで出力")
+def import_batch(source, manifest, db_url, jobs, skip_errors, load_mode, chunk_size, summary):
+    """ディレクトリ・globで指定した複数のCSVをマニフェストに従って取り込む
+
+    SOURCE: CSVを置いたディレクトリ、またはglob（例: "data/2024-05/*.csv"）
+    """
+    from .batch import ManifestError, load_manifest, resolve_files, run_batch
+
+    try:
+        files, unmatched = resolve_files(source, load_manifest(manifest))
+    except ManifestError as e:
+        click.echo(f"エラー: {e}", err=True)
+        sys.exit(1)
+    for path in unmatched:
+        click.echo(f"※ マニフェストに一致しないため対象外: {path}")
+    if not files:
+        click.echo("エラー: 取り込み対象のファイルがありません", err=True)
+        sys.exit(1)
+
+    table_defs = {table: _load_table_def(table) for table in dict.fromkeys(t for _, t in files)}
+    click.echo(f"対象: {len(files)}ファイル（{jobs}並行）")
+
+    def on_done(result):
+        mark = "✅" if result.status == "loaded" else "❌"
+        click.echo(f"{mark} {result.path} → {result.table}: {result.loaded}件 ({result.seconds:.2f}秒)")
+
+    started = time.perf_counter()
+    results = run_batch(
+        files, table_defs, db_url,
+        jobs=jobs, load_mode=load_mode, skip_errors=skip_errors, chunk_size=chunk_size,
+        on_done=on_done,
+    )
+    elapsed = time.perf_counter() - started
+
+    click.echo("\n--- 結果 ---")
+    for r in results:
+        line = f"{r.status:<8} {r.path}  読込{r.rows_read}行 / 投入{r.loaded}件 / エラー{r.errors}件"
+        click.echo(line + (f"  {r.message}" if r.message else ""))
+    loaded = sum(r.loaded for r in results)
+    failed = sum(r.status != "loaded" for r in results)
+    click.echo(f"\n合計: {loaded}件 / {len(results)}ファイル中 {failed}件失敗 ({elapsed:.2f}秒)")
+
+    if summary:
+        _write_batch_summary(results, summary)
+        click.echo(f"結果一覧: {summary}")
+    if failed:
+        sys.exit(1)
+
+
+@main.group()
+def schema():
+    """テーブル定義とDBスキーマの照合"""
+    pass
+
+
+@schema.command("check")
+@click.option("--table", "-t", "tables", multiple=True, help="対象テーブル名（省略時は tables/ の全定義）")
+@click.option("--db-url", envvar="ANSEM_DATABASE_URL", required=True, help="PostgreSQL接続URL")
+def schema_check(tables, db_url):
+    """テーブル定義の列・型・NOT NULL制約をDBスキーマと照合する
+
+    キャッシュは使わず常にDBから取得する（取得結果で import-data 用のキャッシュも更新する）。
+    """
+    from .schema import check_table_def, refresh_schema
+
+    if not tables:
+        tables = sorted(path.stem for path in _tables_dir().glob("*.yaml"))
+    configs = {table: _load_table_def(table).config for table in tables}
+    live = _fetch_schema(refresh_schema, db_url)
+
+    failed = False
+    for table, config in configs.items():
+        if _show_schema_issues(check_table_def(config, live), verbose=True):
+            click.echo(f"OK: {table} ({config['table']})")
+        else:
+            click.echo(f"NG: {table} ({config['table']})")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+def _check_schema(config, db_url, *, verbose=False):
+    """投入前の照合（有効期間内ならキャッシュしたスキーマを使う）。致命的な問題がなければ True"""
+    from .schema import verify_schema
+
+    return _show_schema_issues(_fetch_schema(verify_schema, config, db_url), verbose=verbose)
+
+
+def _fetch_schema(func, *args):
+    """スキーマの取得を伴う処理を実行する（DBに接続できなければ終了）"""
+    import psycopg
+
+    try:
+        return func(*args)
+    except psycopg.Error as e:
+        click.echo(f"エラー: DBスキーマを取得できません: {e}", err=True)
+        sys.exit(1)
+
+
+def _show_schema_issues(issues, *, verbose=False):
+    """照合結果を表示し、致命的な問題がなければ True"""
+    for issue in issues:
+        if issue.fatal:
+            click.echo(f"  エラー: {issue}", err=True)
+        elif verbose:
+            click.echo(f"  警告: {issue}", err=True)
+    return not any(issue.fatal for issue in issues)
+
+
+def _tables_dir():
+    from pathlib import Path
+
+    return Path(__file__).parent.parent.parent / "tables"
+
+
+def _load_table_def(table):
+    """テーブル定義を読み込む（見つからない・不正なら終了）"""
+    from .tabledef import TableDefinitionError, load_table_def
+
+    config_path = _tables_dir() / f"{table}.yaml"
+    if not config_path.exists():
+        click.echo(f"エラー: テーブル定義 {config_path} が見つかりません", err=True)
+        sys.exit(1)
+
+    try:
+        return load_table_def(config_path)
+    except TableDefinitionError as e:
+        click.echo(f"エラー: {e}", err=True)
+        sys.exit(1)
+
+
+def _write_metrics(metrics, path):
+    """計測値をJSONで出力（ファイル指定がなければ標準エラー出力）"""
+    import json
+
+    text = json.dumps(metrics, ensure_ascii=False)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
     else:
-        if not db_url:
-            click.echo("エラー: --db-url または ANSEM_DATABASE_URL が必要です", err=True)
-            sys.exit(1)
-        count = execute_insert(transformed, config, db_url)
-        click.echo(f"\n✅ {count}件を {config['table']} に投入しました")
+        click.echo(text, err=True)
 
 
-def _write_error_report(errors, path):
-    """エラーレポートをCSV出力"""
+def _write_batch_summary(results, path):
+    """import-batch の結果一覧をCSV出力"""
     import csv
     with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["row", "column", "value", "message"])
-        writer.writeheader()
-        writer.writerows(errors)
+        writer = csv.writer(f)
+        writer.writerow(["path", "table", "status", "rows_read", "rows_valid", "loaded", "related", "errors", "seconds", "message"])
+        for r in results:
+            related = " ".join(f"{table}={count}" for table, count in r.related.items())
+            writer.writerow([
+                r.path, r.table, r.status, r.rows_read, r.rows_valid, r.loaded, related, r.errors,
+                f"{r.seconds:.3f}", r.message,
+            ])
+
+
+def _collect_related(batches, related_counts):
+    """親レコードを1件ずつ流し、関連テーブルは件数のみ集計する"""
+    for records, related in batches:
+        for rel_table, rel_records in related.items():
+            related_counts[rel_table] = related_counts.get(rel_table, 0) + len(rel_records)
+        yield from records
+
+
+def _report_errors(errors, report):
+    """バリデーションエラーを列・内容ごとの件数で表示する（明細は --report に出力済み）"""
+    click.echo(f"\n⚠️  バリデーションエラー: {len(errors)}件")
+    for group in errors.summary():
+        rows = ", ".join(str(r) for r in group.rows)
+        more = " …" if group.count > len(group.rows) else ""
+        click.echo(f"  {group.message}: {group.count}件（行 {rows}{more}）")
+    if report:
+        errors.close()
+        click.echo(f"エラーレポート: {report}")
+
+
+def _rows_per_sec(count, elapsed):
+    """スループット（行/秒）"""
+    return count / elapsed if elapsed > 0 else 0.0
 
 
 if __name__ == "__main__":
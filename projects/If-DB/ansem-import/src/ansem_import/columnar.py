@@ -0,0 +1,259 @@
+"""列指向の入出力（Parquet / Arrow IPC）と列単位のバリデーション
+
+pyarrow はオプション依存（pip install 'ansem-import[arrow]'）。
+入力はレコードバッチ単位で読み、必須・形式・ドロップダウンの検査を pyarrow.compute で
+列全体に対してまとめて行う。エラーになったセルだけ validator の検査関数で文言を作るため、
+メッセージはCSV入力と同じになる。
+"""
+
+from pathlib import Path
+from typing import Iterator
+
+from .validator import _check_digits, _check_dropdown, _check_email, check_summary, compile_plan, required_message
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+# validator._EMAIL_RE / digits:N と同じ判定をRE2の構文で書いたもの
+# （Pythonの \s・\d はUnicode対応のため、RE2では \p{Z}・\p{Nd} と、どちらにも入らない
+# str.isspace() の制御文字 \x0b・\x1c-\x1f・\x85 で補う）
+_SPACE = r"\s\p{Z}\x0b\x1c-\x1f\x85"
+_EMAIL_PATTERN = rf"^[^@{_SPACE}]+@[^@{_SPACE}]+\.[^@{_SPACE}]+$"
+_DIGITS_PATTERN = r"^\p{Nd}{%d}$"
+
+
+def is_columnar(filepath) -> bool:
+    return Path(filepath).suffix.lower() in PARQUET_SUFFIXES + ARROW_SUFFIXES
+
+
+def read_batches(filepath, chunk_size: int, skip_rows: int = 0) -> Iterator[tuple[int, object, None]]:
+    """Parquet / Arrow IPC をchunk_size行ずつ読む（先頭行の行番号, RecordBatch, None）
+
+    行番号はCSVに合わせてデータの1行目を2とする。列はすべて文字列に変換し、NULLは空文字にする。
+    """
+    pa = _require_pyarrow()
+
+    row_num = 2
+    for batch in _iter_source(filepath, chunk_size):
+        if skip_rows >= batch.num_rows:
+            skip_rows -= batch.num_rows
+            row_num += batch.num_rows
+            continue
+        if skip_rows:
+            batch = batch.slice(skip_rows)
+            row_num += skip_rows
+            skip_rows = 0
+
+        batch = pa.RecordBatch.from_arrays([_as_text(col) for col in batch.columns], names=batch.schema.names)
+        yield row_num, batch, None
+        row_num += batch.num_rows
+
+
+def validate_batch(batch, config: dict, start_row: int) -> tuple[object, list[dict]]:
+    """レコードバッチを列単位で検査する（正常行だけのRecordBatch, エラー）
+
+    エラーの並びは validate_csv と同じ（行番号順、行内はプランの列順）。
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    header = {name: i for i, name in enumerate(batch.schema.names)}
+    invalid = None  # エラーのある行（どの列も検査しなければNoneのまま）
+    errors = []
+
+    for order, (col_def, rule) in enumerate(_checked_columns(config)):
+        index = header.get(rule.csv)
+        if index is None:
+            values = pa.array([""] * batch.num_rows)
+        else:
+            values = pc.utf8_trim_whitespace(batch.column(index))
+        empty = pc.equal(values, "")
+
+        if rule.required:
+            errors.extend(_cell_errors(empty, values, start_row, order, rule.csv, None))
+            invalid = empty if invalid is None else pc.or_(invalid, empty)
+
+        for failed, check in _column_checks(col_def, rule, values):
+            failed = pc.and_(failed, pc.invert(empty))
+            errors.extend(_cell_errors(failed, values, start_row, order, rule.csv, check))
+            invalid = failed if invalid is None else pc.or_(invalid, failed)
+
+    errors.sort(key=lambda e: (e["row"], e.pop("_order")))
+    if invalid is None:
+        return batch, errors
+    return batch.filter(pc.invert(invalid)), errors
+
+
+def batch_rows(batch, config: dict) -> tuple[list[tuple], dict[str, int]]:
+    """変換に使う列だけを行タプルにする（行タプルのリスト, ヘッダー索引）"""
+    names = set(batch.schema.names)
+    columns = [c["csv"] for c in config["columns"]]
+    for rel in config.get("related_tables", []):
+        columns.extend(c["csv"] for c in rel["columns"])
+    columns = [c for c in dict.fromkeys(columns) if c in names]
+
+    header = {name: i for i, name in enumerate(columns)}
+    if not columns:
+        return [()] * batch.num_rows, header
+    return list(zip(*(batch.column(name).to_pylist() for name in columns))), header
+
+
+def write_parquet_audit(batches, config: dict, path) -> Iterator:
+    """投入するチャンクを流しながら、変換後のレコードをParquetに書き出す
+
+    親テーブルは path、関連テーブルは `<path の stem>.<テーブル名>.parquet` に書く
+    （関連テーブルには親レコードの通し番号 _parent_index を付ける）。
+    """
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    tables = [(config["table"], config["columns"], path, False)]
+    for rel in config.get("related_tables", []):
+        col_defs = rel["columns"] + [{"db": k, "extra_value": v} for k, v in _extra_columns(rel).items()]
+        tables.append((rel["table"], col_defs, path.with_name(f"{path.stem}.{rel['table']}.parquet"), True))
+
+    writers = {}
+    schemas = {}
+    for table_name, col_defs, out_path, is_related in tables:
+        fields = [pa.field(c["db"], _audit_type(pa, c)) for c in _unique_db_columns(col_defs)]
+        if is_related:
+            fields.insert(0, pa.field("_parent_index", pa.int64()))
+        schemas[table_name] = pa.schema(fields)
+        writers[table_name] = pq.ParquetWriter(out_path, schemas[table_name])
+
+    offset = 0
+    try:
+        for records, related in batches:
+            main = config["table"]
+            writers[main].write_table(pa.Table.from_pylist(records, schema=schemas[main]))
+            for rel_table, rel_records in related.items():
+                rows = [{"_parent_index": offset + i, **record} for i, record in rel_records]
+                writers[rel_table].write_table(pa.Table.from_pylist(rows, schema=schemas[rel_table]))
+            offset += len(records)
+            yield records, related
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError(
+            "Parquet / Arrow の読み書きには pyarrow が必要です（pip install 'ansem-import[arrow]'）"
+        ) from None
+    return pyarrow
+
+
+def _iter_source(filepath, chunk_size: int):
+    import pyarrow as pa
+
+    if Path(filepath).suffix.lower() in PARQUET_SUFFIXES:
+        import pyarrow.parquet as pq
+
+        yield from pq.ParquetFile(filepath).iter_batches(batch_size=chunk_size)
+        return
+
+    with pa.memory_map(str(filepath)) as source:
+        try:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            source.seek(0)
+            batches = pa.ipc.open_stream(source)
+        for batch in batches:
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size)
+
+
+def _as_text(column):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not pa.types.is_string(column.type):
+        column = pc.cast(column, pa.string())
+    return pc.fill_null(column, "")
+
+
+def _checked_columns(config: dict):
+    """compile_plan と同じ順で（列定義, ルール）を返す（検査対象のない列は除く）"""
+    col_defs = list(config["columns"])
+    for rel in config.get("related_tables", []):
+        col_defs.extend(rel["columns"])
+    rules = {rule.csv: rule for rule in compile_plan(config)}
+    seen = set()
+    for col_def in col_defs:
+        rule = rules.get(col_def["csv"])
+        if rule is not None and col_def["csv"] not in seen:
+            seen.add(col_def["csv"])
+            yield col_def, rule
+
+
+def _column_checks(col_def: dict, rule, values):
+    """列全体の検査結果（失敗ならTrueの配列, メッセージ用の検査関数）を返す"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    fmt = col_def.get("format")
+    if fmt == "email":
+        yield pc.invert(pc.match_substring_regex(values, _EMAIL_PATTERN)), _check_email
+    elif fmt and fmt.startswith("digits:"):
+        length = int(fmt.split(":")[1])
+        check = next(c for c in rule.checks if getattr(c, "func", None) is _check_digits)
+        yield pc.invert(pc.match_substring_regex(values, _DIGITS_PATTERN % length)), check
+
+    if col_def.get("type") == "dropdown":
+        allowed = pa.array([k for k in col_def.get("mapping", {}) if isinstance(k, str)], pa.string())
+        check = next(c for c in rule.checks if getattr(c, "func", None) is _check_dropdown)
+        yield pc.invert(pc.is_in(values, value_set=allowed)), check
+
+
+def _cell_errors(failed, values, start_row: int, order: int, csv_col: str, check) -> list[dict]:
+    """失敗したセルだけエラーにする（check=None は必須チェック）"""
+    import pyarrow.compute as pc
+
+    errors = []
+    summary = check_summary(check, csv_col)
+    for i in pc.indices_nonzero(failed).to_pylist():
+        value = values[i].as_py()
+        errors.append({
+            "row": start_row + i,
+            "column": csv_col,
+            "value": "" if check is None else value,
+            "message": required_message(csv_col) if check is None else check(value),
+            "check": summary,
+            "_order": order,
+        })
+    return errors
+
+
+def _extra_columns(rel: dict) -> dict:
+    extra = {}
+    for col_def in rel["columns"]:
+        extra.update(col_def.get("extra", {}))
+    return extra
+
+
+def _unique_db_columns(col_defs: list[dict]) -> list[dict]:
+    seen = {}
+    for col_def in col_defs:
+        seen.setdefault(col_def["db"], col_def)
+    return list(seen.values())
+
+
+def _audit_type(pa, col_def: dict):
+    """変換後の値の型（ドロップダウンは対応表の値、lookupはID）"""
+    if "extra_value" in col_def:
+        return pa.int64() if isinstance(col_def["extra_value"], int) else pa.string()
+    col_type = col_def.get("type")
+    if col_type == "boolean":
+        return pa.bool_()
+    if col_type == "lookup":
+        return pa.int64()
+    if col_type == "dropdown" and all(
+        isinstance(v, int) and not isinstance(v, bool) for v in col_def["mapping"].values()
+    ):
+        return pa.int64()
+    return pa.string()
@@ -0,0 +1,137 @@
+"""重複行の検出（テーブル定義の dedup_key）
+
+キー列の値（変換後）をハッシュ化した索引で、ファイル内の重複をO(n)で検出する。
+既存データとの重複は、投入先テーブルのキーを最初に1回だけまとめて取得して照合する。
+重複した行は元の行番号つきのバリデーションエラーとして扱うため、DBへ書き込む前に報告される。
+
+テーブル定義の例（DB列名で指定。省略時は natural_key を使う）:
+    dedup_key: [influencer_name]
+"""
+
+import hashlib
+
+from .reader import row_getter
+from .transformer import _convert_value
+from .validator import SUMMARY_VALUE
+
+_SEPARATOR = "\x1f"
+_FETCH_SIZE = 10000
+
+
+def dedup_columns(config: dict) -> list[dict]:
+    """重複判定に使う列定義（dedup_key がなければ natural_key、どちらもなければ空）"""
+    keys = config.get("dedup_key") or config.get("natural_key") or []
+    col_defs = {c["db"]: c for c in config["columns"]}
+    return [col_defs[k] for k in keys if k in col_defs]
+
+
+def row_keys(valid, header: dict[str, int] | None, key_defs: list[dict]) -> list[tuple[str, ...] | None]:
+    """正常行ごとのキー（変換後の値の文字列表現）を返す。キー列に空があればNone
+
+    header がNoneの場合、valid は Parquet / Arrow のRecordBatch。
+    """
+    columns = [c["csv"] for c in key_defs]
+    if header is None:
+        names = set(valid.schema.names)
+        header = {c: i for i, c in enumerate(columns) if c in names}
+        valid = list(zip(*(valid.column(c).to_pylist() for c in header))) if header else [()] * len(valid)
+
+    keys = []
+    for values in map(row_getter(header, columns), valid):
+        values = [v.strip() for v in values]
+        if all(values):
+            keys.append(tuple(str(_convert_value(v, c)) for v, c in zip(values, key_defs)))
+        else:
+            keys.append(None)
+    return keys
+
+
+class DedupIndex:
+    """キーのハッシュ → 最初に現れた行番号
+
+    existing: 投入先テーブルにあるキーのハッシュ（fetch_existing_keys）
+    """
+
+    def __init__(self, key_defs: list[dict], existing: set[int] | None = None):
+        self._key_defs = key_defs
+        self._label = key_label(key_defs)
+        self._existing = existing or set()
+        self._seen: dict[int, int] = {}
+
+    def check(self, keys: list, row_numbers: list[int]) -> tuple[list[int], list[dict]]:
+        """重複した行の位置と、その行のエラーを返す（初出の行は索引に登録）"""
+        duplicates = []
+        errors = []
+        column = self._key_defs[0]["csv"]
+
+        for i, (key, row) in enumerate(zip(keys, row_numbers)):
+            if key is None:
+                continue
+            digest = key_hash(key)
+            if digest in self._existing:
+                message = summary = duplicate_message(self._label)
+            elif digest in self._seen:
+                message = duplicate_message(self._label, self._seen[digest])
+                summary = duplicate_message(self._label, SUMMARY_VALUE)
+            else:
+                self._seen[digest] = row
+                continue
+            duplicates.append(i)
+            errors.append({
+                "row": row, "column": column, "value": _SEPARATOR.join(key), "message": message, "check": summary,
+            })
+
+        return duplicates, errors
+
+
+def key_label(key_defs: list[dict]) -> str:
+    return "・".join(f"「{c['csv']}」" for c in key_defs)
+
+
+def duplicate_message(label: str, first_row: int | str | None = None) -> str:
+    """重複エラーの文言（first_row がNoneなら既存データとの重複）"""
+    if first_row is None:
+        return f"{label}が登録済みのデータと重複しています"
+    return f"{label}が行{first_row}と重複しています"
+
+
+def key_hash(key: tuple[str, ...]) -> int:
+    """キーを8バイトのハッシュにする（プロセスをまたいでも同じ値）"""
+    digest = hashlib.blake2b(_SEPARATOR.join(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def fetch_existing_keys(config: dict, key_defs: list[dict], db_url: str) -> set[int]:
+    """投入先テーブルの既存キーをまとめて取得し、ハッシュの集合にする"""
+    import psycopg
+
+    cols = ", ".join(c["db"] for c in key_defs)
+    not_null = " AND ".join(f"{c['db']} IS NOT NULL" for c in key_defs)
+    existing = set()
+
+    with psycopg.connect(db_url) as conn:
+        with conn.cursor(name="ansem_dedup_keys") as cur:
+            cur.itersize = _FETCH_SIZE
+            cur.execute(f"SELECT {cols} FROM {config['table']} WHERE {not_null}")
+            for row in cur:
+                existing.add(key_hash(tuple(str(v) for v in row)))
+
+    return existing
+
+
+def drop_rows(records: list[dict], related: dict, indices: list[int]) -> tuple[list[dict], dict]:
+    """親レコードを indices の位置で取り除き、関連テーブルの親インデックスを詰め直す"""
+    dropped = set(indices)
+    new_index = {}
+    kept = []
+    for i, record in enumerate(records):
+        if i not in dropped:
+            new_index[i] = len(kept)
+            kept.append(record)
+
+    kept_related = {}
+    for table, rel_records in related.items():
+        rel_kept = [(new_index[i], record) for i, record in rel_records if i in new_index]
+        if rel_kept:
+            kept_related[table] = rel_kept
+    return kept, kept_related
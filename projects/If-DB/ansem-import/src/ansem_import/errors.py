@@ -0,0 +1,90 @@
+"""バリデーションエラーの集計（件数は列・内容ごと、明細はレポートCSVへ逐次出力）
+
+大量にエラーのあるファイルでもメモリと端末出力が増え続けないよう、保持するのは
+列・内容ごとの件数と先頭 samples 件の行番号だけにする。
+"""
+
+import csv
+from dataclasses import dataclass, field
+
+REPORT_FIELDS = ["row", "column", "value", "message"]
+SAMPLE_ROWS = 5
+
+
+class TooManyErrors(Exception):
+    """エラー件数が --max-errors を超えた"""
+
+
+@dataclass
+class ErrorGroup:
+    """同じ列・同じ内容のエラーの集計"""
+
+    column: str
+    message: str  # 値の部分を「…」にした検査ごとの文言（エラーの check）
+    first_message: str = ""  # 最初のエラーの、値を含む文言（rows[0] の行のもの）
+    count: int = 0
+    rows: list[int] = field(default_factory=list)  # 先頭 samples 件の行番号
+
+
+class ErrorCollector:
+    """validate_csv のエラーを集計する（process_chunks には list の代わりに渡せる）
+
+    エラーは row / column / value / message と、集計のキーになる check（値を「…」にした文言）を持つ。
+
+    report: 指定時は全件の明細をCSVへ逐次書き出す（close() で閉じる）
+    max_errors: この件数を超えたら TooManyErrors を送出して処理を打ち切る
+    """
+
+    def __init__(self, report=None, max_errors: int | None = None, samples: int = SAMPLE_ROWS):
+        self.count = 0
+        self.groups: dict[tuple[str, str], ErrorGroup] = {}
+        self._samples = samples
+        self._max_errors = max_errors
+        self._report_file = None
+        self._writer = None
+        if report:
+            self._report_file = open(report, "w", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._report_file, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+            self._writer.writeheader()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def extend(self, errors: list[dict]) -> None:
+        if not errors:
+            return
+        if self._writer:
+            self._writer.writerows(errors)
+
+        for err in errors:
+            # 値を含まない検査ごとの文言で集計する（値が文言の他の部分と重なっても分かれない）
+            key = (err["column"], err["check"])
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = ErrorGroup(*key, first_message=err["message"])
+            group.count += 1
+            if len(group.rows) < self._samples:
+                group.rows.append(err["row"])
+        self.count += len(errors)
+
+        if self._max_errors is not None and self.count > self._max_errors:
+            raise TooManyErrors(f"エラーが {self._max_errors}件を超えたため中断しました")
+
+    def summary(self) -> list[ErrorGroup]:
+        """件数の多い順"""
+        return sorted(self.groups.values(), key=lambda g: -g.count)
+
+    def close(self) -> None:
+        if self._report_file:
+            self._report_file.close()
+            self._report_file = None
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
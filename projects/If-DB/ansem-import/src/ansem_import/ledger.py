@@ -0,0 +1,148 @@
+"""投入済みファイルの台帳（同じファイルの再投入を防ぐ）
+
+ファイル内容のSHA-256・テーブル定義のハッシュ・投入先DBの組で投入済みかを記録する
+（SQLite、既定は `$XDG_STATE_HOME/ansem-import/ledger.sqlite3`）。
+照合はまずパス・サイズ・更新時刻で行い、一致しなければ内容をハッシュして照合するため、
+変更のないファイルはファイルを読まずに判定できる（コピーや touch された場合も内容で一致する）。
+件数・所要時間もあわせて残すので、スループットの集計にも使える。
+"""
+
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .checkpoint import file_hash
+
+LEDGER_FILENAME = "ledger.sqlite3"
+_ENTRY_COLUMNS = "path, table_name, rows_read, rows_loaded, errors, seconds, imported_at"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS imports (
+    content_sha256 TEXT NOT NULL,
+    table_def_sha256 TEXT NOT NULL,
+    db TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    table_name TEXT NOT NULL,
+    rows_read INTEGER NOT NULL,
+    rows_loaded INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    imported_at TEXT NOT NULL,
+    PRIMARY KEY (content_sha256, table_def_sha256, db)
+);
+CREATE INDEX IF NOT EXISTS imports_by_path ON imports (path, size, mtime_ns);
+"""
+
+
+@dataclass
+class LedgerEntry:
+    """投入済みファイル1件の記録"""
+
+    path: str
+    table_name: str
+    rows_read: int
+    rows_loaded: int
+    errors: int
+    seconds: float
+    imported_at: str  # ISO 8601（UTC）
+
+
+def default_ledger_path() -> Path:
+    state_home = os.environ.get("XDG_STATE_HOME") or Path.home() / ".local" / "state"
+    return Path(state_home) / "ansem-import" / LEDGER_FILENAME
+
+
+def table_def_hash(config: dict) -> str:
+    """テーブル定義（解析済み）のSHA-256。定義が変われば別の投入として扱う"""
+    text = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def db_key(db_url: str) -> str:
+    """投入先DBの識別子（接続URLのハッシュ。パスワードを台帳に残さない）"""
+    return hashlib.sha256(db_url.encode()).hexdigest()[:12]
+
+
+class ImportLedger:
+    """投入済みファイルの台帳
+
+    ledger = ImportLedger(path)
+    entry = ledger.find(filepath, table_hash, db_url)  # 投入済みなら LedgerEntry
+    ledger.record(filepath, table_hash, db_url, entry)
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else default_ledger_path()
+        self._content_hashes: dict[str, str] = {}
+
+    def find(self, filepath, table_hash: str, db_url: str) -> LedgerEntry | None:
+        """投入済みなら記録を返す（パス・サイズ・更新時刻が一致すればファイルを読まない）"""
+        if not self.path.exists():
+            return None
+        source, stat = _source(filepath)
+
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {_ENTRY_COLUMNS} FROM imports"
+                " WHERE path = ? AND size = ? AND mtime_ns = ? AND table_def_sha256 = ? AND db = ?",
+                (source, stat.st_size, stat.st_mtime_ns, table_hash, db_key(db_url)),
+            ).fetchone()
+            if row is None:
+                row = conn.execute(
+                    f"SELECT {_ENTRY_COLUMNS} FROM imports"
+                    " WHERE content_sha256 = ? AND table_def_sha256 = ? AND db = ?",
+                    (self.content_hash(filepath), table_hash, db_key(db_url)),
+                ).fetchone()
+        return LedgerEntry(*row) if row else None
+
+    def record(self, filepath, table_hash: str, db_url: str, entry: LedgerEntry) -> None:
+        """投入結果を記録する（同じ内容・定義・DBの記録は置き換える）"""
+        source, stat = _source(filepath)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO imports (content_sha256, table_def_sha256, db, path, size, mtime_ns,"
+                " table_name, rows_read, rows_loaded, errors, seconds, imported_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.content_hash(filepath), table_hash, db_key(db_url), source, stat.st_size,
+                    stat.st_mtime_ns, entry.table_name, entry.rows_read, entry.rows_loaded, entry.errors,
+                    entry.seconds, entry.imported_at,
+                ),
+            )
+
+    def content_hash(self, filepath) -> str:
+        """ファイル内容のSHA-256（1回の実行で同じファイルは1回だけ読む）"""
+        source = str(Path(filepath).resolve())
+        if source not in self._content_hashes:
+            self._content_hashes[source] = file_hash(filepath)
+        return self._content_hashes[source]
+
+    @contextmanager
+    def _connect(self):
+        """with の終わりでコミット（例外時はロールバック）して閉じる接続"""
+        import sqlite3
+
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.executescript(_SCHEMA)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _source(filepath) -> tuple[str, os.stat_result]:
+    path = Path(filepath).resolve()
+    return str(path), path.stat()
@@ -1,44 +1,500 @@
 """DB投入（DRY RUN / 本番）"""
 
+import hashlib
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator
 
-def generate_sql(rows: list[dict], config: dict) -> list[str]:
+from .metrics import CountingCursor, StageMetrics, timed
+from .pipeline import chunked
+
+COPY_BATCH_SIZE = 10000
+UPSERT_BATCH_SIZE = 1000
+SQL_WRITE_BUFFER = 1024 * 1024
+MAX_BIND_PARAMS = 65535  # PostgreSQLの1文あたりのバインド変数上限
+PREPARED_BATCH_ROWS = 100  # prepared モードで1文にまとめる行数
+
+_CELL_HASH_LEN = 16
+_HASH_NULL = "\\N"
+
+
+class MissingSequence(Exception):
+    """主キーに順序（IDENTITY / serial）がなく、指定の投入方式で関連テーブルをつなげない"""
+
+
+def generate_sql(rows: Iterable[dict], config: dict, batch_size: int = 1) -> list[str]:
     """INSERT SQLを生成する（DRY RUN用）"""
+    return list(iter_sql(rows, config, batch_size))
+
+
+def iter_sql(rows: Iterable[dict], config: dict, batch_size: int = 1) -> Iterator[str]:
+    """INSERT SQLを1文ずつ生成する（ストリーミング用）
+
+    batch_size>1 の場合は batch_size 行ごとに、非NULL列の組み合わせが
+    同じ行を複数行VALUESの1文にまとめる。
+    """
     table_name = config["table"]
-    statements = []
 
-    for row in rows:
-        cols = [k for k, v in row.items() if v is not None]
-        vals = [_sql_value(row[c]) for c in cols]
+    for batch in chunked(rows, batch_size):
+        groups: dict[tuple[str, ...], list[str]] = {}
+        for row in batch:
+            cols = tuple(k for k, v in row.items() if v is not None)
+            vals = [_sql_value(row[c]) for c in cols]
+            groups.setdefault(cols, []).append(f"({', '.join(vals)})")
 
-        sql = f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES ({', '.join(vals)});"
-        statements.append(sql)
+        for cols, values in groups.items():
+            yield f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES {', '.join(values)};"
 
-    return statements
 
+def write_sql(statements: Iterable[str], path) -> int:
+    """SQLをファイルへ書き出す（psqlでそのまま再実行できるようトランザクションで囲む）
+
+    戻り値: 書き出した文の数
+    """
+    count = 0
+
+    with open(path, "w", encoding="utf-8", buffering=SQL_WRITE_BUFFER) as f:
+        f.write("BEGIN;\n")
+        for stmt in statements:
+            f.write(stmt)
+            f.write("\n")
+            count += 1
+        f.write("COMMIT;\n")
+
+    return count
+
+
+@dataclass
+class LoadResult:
+    """投入結果"""
+
+    count: int = 0  # 親テーブルに書き込んだ件数
+    skipped: int = 0  # 変更なしでスキップした件数（diff_only）
+    related: dict[str, int] = field(default_factory=dict)  # 関連テーブル名 → 件数
+    round_trips: int = 0  # DBへの往復回数（execute / executemany / COPY）
+
+
+def load_batches(
+    batches: Iterable[tuple[list[dict], dict[str, list[tuple[int, dict]]]]],
+    config: dict,
+    db_url: str,
+    mode: str = "insert",
+    *,
+    with_related: bool = False,
+    diff_only: bool = False,
+    commit_every: int | None = None,
+    on_commit: Callable[[LoadResult], None] | None = None,
+    metrics: StageMetrics | None = None,
+    conn=None,
+) -> LoadResult:
+    """チャンク（親レコード, 関連テーブルのレコード）単位でDBに投入する
+
+    mode: insert（1行ずつINSERT） / copy（COPY FROM STDIN） / upsert（ON CONFLICT）
+        / prepared（列を固定したプリペアド文をexecutemanyで送る。トリガー等でCOPYを使えない場合用）
+    with_related: 関連テーブルも投入する（insert は親をRETURNINGで主キーを受け取り、
+        copy / prepared は順序から主キーを先に採番して親に含めて送る）
+    commit_every: 未指定ならファイル全体を1トランザクションで投入する。
+        指定時は書き込みがcommit_every件に達したチャンク境界でコミットし、
+        コミットのたびに on_commit(result) を呼ぶ（チェックポイント記録用）。
+    metrics: 書き込み（バッチの生成を除く）にかかった時間と件数を加算する
+    conn: 既存の接続に書き込む（接続プール用。指定時は db_url を使わず、接続も閉じない）
+    """
+    if conn is not None:
+        return _load_on(conn, batches, config, mode, with_related, diff_only, commit_every, on_commit, metrics)
 
-def execute_insert(rows: list[dict], config: dict, db_url: str) -> int:
-    """DBに直接INSERT（トランザクション）"""
     import psycopg
 
+    with psycopg.connect(db_url) as conn:
+        return _load_on(conn, batches, config, mode, with_related, diff_only, commit_every, on_commit, metrics)
+
+
+def _load_on(conn, batches, config, mode, with_related, diff_only, commit_every, on_commit, metrics) -> LoadResult:
+    result = LoadResult()
+    metrics = metrics if metrics is not None else StageMetrics()
+
+    with conn.cursor() as raw_cur:
+        cur = CountingCursor(raw_cur)
+        write = _make_writer(cur, config, mode, with_related, diff_only)
+        uncommitted = 0
+        commits = 0
+
+        for records, related in batches:
+            written = result.count
+            with timed(metrics):
+                write(records, related, result)
+            metrics.rows_in += len(records)
+            metrics.rows_out += result.count - written
+            uncommitted += len(records)
+            if commit_every and uncommitted >= commit_every:
+                conn.commit()
+                commits += 1
+                uncommitted = 0
+                if on_commit:
+                    on_commit(result)
+
+    conn.commit()
+    result.round_trips = cur.round_trips + commits + 1
+
+    if on_commit:
+        on_commit(result)
+
+    return result
+
+
+def execute_insert(rows: Iterable[dict], config: dict, db_url: str) -> int:
+    """DBに直接INSERT（トランザクション）"""
+    return load_batches(_as_batches(rows), config, db_url, "insert").count
+
+
+def _as_batches(rows: Iterable[dict]) -> Iterator[tuple[list[dict], dict]]:
+    """レコード列を関連テーブルなしのチャンク列にする"""
+    for batch in chunked(rows, COPY_BATCH_SIZE):
+        yield batch, {}
+
+
+def _make_writer(cur, config: dict, mode: str, with_related: bool, diff_only: bool):
+    """1チャンクを書き込む関数 write(records, related, result) を返す"""
     table_name = config["table"]
+
+    if mode == "upsert":
+        existing = _fetch_row_hashes(cur, config) if diff_only else None
+
+        def write(records, related, result):
+            written, skipped = _upsert_rows(cur, config, records, existing)
+            result.count += written
+            result.skipped += skipped
+
+    elif mode == "prepared":
+        cols = _fixed_columns(config["columns"])
+        rel_statements = {}
+        if with_related:
+            # 主キーを先に採番して親に含めるため、親もRETURNINGなしの同じ文をまとめて送れる
+            primary_key = config["primary_key"]
+            sequence = primary_key_sequence(cur, table_name, primary_key, "--load-mode prepared")
+            cols = (primary_key, *cols)
+            for rel in config.get("related_tables", []):
+                fk = rel["foreign_key"]
+                rel_cols = (fk, *_fixed_columns(rel["columns"]))
+                rel_statements[rel["table"]] = (fk, rel_cols, _fixed_insert_sql(cur, rel["table"], rel_cols))
+        sql = _fixed_insert_sql(cur, table_name, cols, overriding=with_related)
+
+        def write(records, related, result):
+            if not with_related:
+                _execute_fixed(cur, sql, cols, records)
+                result.count += len(records)
+                return
+
+            ids = _next_ids(cur, sequence, len(records))
+            _execute_fixed(cur, sql, cols, [{primary_key: i, **r} for i, r in zip(ids, records)])
+            result.count += len(records)
+            for rel_table, rel_records in related.items():
+                fk, rel_cols, rel_sql = rel_statements[rel_table]
+                rows = [{fk: ids[i], **record} for i, record in rel_records]
+                _execute_fixed(cur, rel_sql, rel_cols, rows)
+                result.related[rel_table] = result.related.get(rel_table, 0) + len(rows)
+
+    elif mode == "copy" and with_related:
+        primary_key = config["primary_key"]
+        sequence = primary_key_sequence(cur, table_name, primary_key, "--load-mode copy")
+        foreign_keys = {rel["table"]: rel["foreign_key"] for rel in config.get("related_tables", [])}
+
+        def write(records, related, result):
+            ids = _next_ids(cur, sequence, len(records))
+            result.count += _copy_rows(cur, table_name, ({primary_key: i, **r} for i, r in zip(ids, records)))
+
+            for rel_table, rel_records in related.items():
+                fk = foreign_keys[rel_table]
+                rows = ({fk: ids[i], **record} for i, record in rel_records)
+                result.related[rel_table] = (
+                    result.related.get(rel_table, 0) + _copy_rows(cur, rel_table, rows)
+                )
+
+    elif with_related:
+        primary_key = config["primary_key"]
+        foreign_keys = {rel["table"]: rel["foreign_key"] for rel in config.get("related_tables", [])}
+
+        def write(records, related, result):
+            ids = _insert_returning(cur, table_name, records, primary_key)
+            result.count += len(ids)
+
+            for rel_table, rel_records in related.items():
+                fk = foreign_keys[rel_table]
+                rows = ({fk: ids[i], **record} for i, record in rel_records)
+                result.related[rel_table] = (
+                    result.related.get(rel_table, 0) + _copy_rows(cur, rel_table, rows)
+                )
+
+    elif mode == "copy":
+        def write(records, related, result):
+            result.count += _copy_rows(cur, table_name, records)
+
+    else:
+        def write(records, related, result):
+            result.count += _insert_rows(cur, table_name, records)
+
+    return write
+
+
+def _insert_rows(cur, table_name: str, rows: Iterable[dict]) -> int:
+    """1行ずつINSERTし、件数を返す"""
     count = 0
 
-    with psycopg.connect(db_url) as conn:
-        with conn.cursor() as cur:
-            for row in rows:
-                cols = [k for k, v in row.items() if v is not None]
-                placeholders = ["%s"] * len(cols)
-                values = [row[c] for c in cols]
+    for row in rows:
+        cols = [k for k, v in row.items() if v is not None]
+        placeholders = ["%s"] * len(cols)
+        values = [row[c] for c in cols]
 
-                sql = f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES ({', '.join(placeholders)})"
-                cur.execute(sql, values)
-                count += 1
+        sql = f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES ({', '.join(placeholders)})"
+        cur.execute(sql, values)
+        count += 1
 
-        conn.commit()
+    return count
+
+
+def _upsert_rows(cur, config: dict, rows: list[dict], existing: dict | None) -> tuple[int, int]:
+    """複数行VALUESの INSERT ... ON CONFLICT で書き込む
+
+    existing（_fetch_row_hashesの結果）がある場合は内容が同じ行を除外する。
+    戻り値: (書き込んだ件数, 変更なしでスキップした件数)
+    """
+    table_name = config["table"]
+    keys = natural_key(config)
+    written = 0
+    skipped = 0
+
+    for batch in chunked(rows, UPSERT_BATCH_SIZE):
+        if existing is not None:
+            changed = [
+                r for r in batch
+                if not _is_unchanged(r, existing.get(_key_of(r, keys)), config)
+            ]
+            skipped += len(batch) - len(changed)
+            batch = changed
+
+        # 同じ文の中で同一キーを2回更新できないため、バッチ内は後勝ちで1件にする
+        groups: dict[tuple[str, ...], dict[tuple, tuple]] = {}
+        for row in batch:
+            cols = tuple(k for k, v in row.items() if v is not None)
+            groups.setdefault(cols, {})[_key_of(row, keys)] = tuple(row[c] for c in cols)
+
+        for cols, by_key in groups.items():
+            values = list(by_key.values())
+            for part in chunked(values, max(1, MAX_BIND_PARAMS // len(cols))):
+                sql = _upsert_sql(table_name, cols, keys, len(part))
+                cur.execute(sql, [v for value in part for v in value])
+            written += len(values)
+
+    return written, skipped
+
+
+def natural_key(config: dict) -> list[str]:
+    """テーブル定義のnatural_key（DB列名のリスト）"""
+    keys = config.get("natural_key")
+    if not keys:
+        raise ValueError(f"テーブル定義 {config['table']} に natural_key がありません")
+    return [keys] if isinstance(keys, str) else list(keys)
+
+
+def _upsert_sql(table_name: str, cols: tuple[str, ...], keys: list[str], n_rows: int) -> str:
+    """n_rows行分のVALUESを持つ INSERT ... ON CONFLICT 文"""
+    row_placeholders = f"({', '.join(['%s'] * len(cols))})"
+    updates = [c for c in cols if c not in keys]
+    if updates:
+        action = "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in updates)
+    else:
+        action = "DO NOTHING"
+
+    return (
+        f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES {', '.join([row_placeholders] * n_rows)}"
+        f" ON CONFLICT ({', '.join(keys)}) {action}"
+    )
+
+
+def _fetch_row_hashes(cur, config: dict) -> dict[tuple, str]:
+    """既存行の natural_key → 内容ハッシュ を1クエリで取得する
+
+    内容ハッシュは列ごとのmd5先頭_CELL_HASH_LEN桁を列順に連結したもの。
+    列単位で持つことで、空セル（DBの値を変更しない列）を比較から外せる。
+    """
+    keys = natural_key(config)
+    key_exprs = ", ".join(f"{k}::text" for k in keys)
+    hash_expr = " || ".join(
+        f"left(md5(coalesce({c['db']}::text, '{_HASH_NULL}')), {_CELL_HASH_LEN})"
+        for c in config["columns"]
+    )
+
+    cur.execute(f"SELECT {key_exprs}, {hash_expr} FROM {config['table']}")
+    return {tuple(row[:-1]): row[-1] for row in cur}
+
+
+def _is_unchanged(row: dict, stored: str | None, config: dict) -> bool:
+    """投入レコードが既存行と同じ内容か（空セルの列は比較しない）"""
+    if stored is None:
+        return False
+
+    for i, col_def in enumerate(config["columns"]):
+        value = row.get(col_def["db"])
+        if value is None:
+            continue
+        offset = i * _CELL_HASH_LEN
+        if stored[offset:offset + _CELL_HASH_LEN] != _cell_hash(value):
+            return False
+
+    return True
+
+
+def _cell_hash(value) -> str:
+    return hashlib.md5(_hash_text(value).encode()).hexdigest()[:_CELL_HASH_LEN]
+
+
+def _key_of(row: dict, keys: list[str]) -> tuple:
+    return tuple(_hash_text(row.get(k)) for k in keys)
+
+
+def _hash_text(value) -> str:
+    """PostgreSQLの ::text キャストと同じ文字列表現"""
+    if value is None:
+        return _HASH_NULL
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _insert_returning(cur, table_name: str, records: list[dict], returning: str) -> list:
+    """レコードをINSERTし、recordsと同じ順で returning 列の値を返す
+
+    非NULL列の組み合わせごとにexecutemany（パイプライン）で送り、往復を1回にまとめる。
+    """
+    ids = [None] * len(records)
+
+    for cols, indices in _group_indices_by_shape(records).items():
+        sql = _insert_sql(table_name, cols) + f" RETURNING {returning}"
+        cur.executemany(sql, [tuple(records[i][c] for c in cols) for i in indices], returning=True)
+        for i in indices:
+            ids[i] = cur.fetchone()[0]
+            cur.nextset()
+
+    return ids
+
+
+def primary_key_sequence(cur, table_name: str, primary_key: str, option: str) -> str:
+    """主キーの順序（IDENTITY / serial）の名前。なければ関連テーブルをつなげないため MissingSequence"""
+    cur.execute("SELECT pg_get_serial_sequence(%s, %s)", (table_name, primary_key))
+    sequence = cur.fetchone()[0]
+    if sequence is None:
+        raise MissingSequence(
+            f"{table_name}.{primary_key} に順序（IDENTITY / serial）がないため、{option} で関連テーブルを投入できません"
+        )
+    return sequence
+
+
+def _next_ids(cur, sequence: str, n: int) -> list:
+    """順序から n 件の主キーを1回の往復でまとめて採番する（親レコードの順）"""
+    if not n:
+        return []
+    cur.execute("SELECT nextval(%s) FROM generate_series(1, %s)", (sequence, n))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _fixed_columns(col_defs: list[dict]) -> tuple[str, ...]:
+    """テーブル定義の列（extraの列を含む）を重複なく定義順に並べる"""
+    cols = {}
+    for col_def in col_defs:
+        cols[col_def["db"]] = None
+        cols.update(dict.fromkeys(col_def.get("extra", {})))
+    return tuple(cols)
+
+
+def _fixed_insert_sql(cur, table_name: str, cols: tuple[str, ...], overriding: bool = False) -> tuple[str, str]:
+    """列を固定したINSERT文（prepared モード用）。戻り値は (VALUES までの文頭, 1行分の値)
+
+    行ごとにNULL列を省く代わりに全列を送り、NULLはDBのDEFAULT式で置き換える
+    （列を省略した場合と同じ結果になる）。文の形が決まっているため、
+    psycopg の自動プリペア（prepare_threshold）でサーバー側のプリペアド文として再利用される。
+    overriding: 採番済みの主キーを IDENTITY 列へ入れる（OVERRIDING SYSTEM VALUE）
+    """
+    defaults = _column_defaults(cur, table_name)
+    values = [f"COALESCE(%s, {defaults[c]})" if c in defaults else "%s" for c in cols]
+    clause = " OVERRIDING SYSTEM VALUE" if overriding else ""
+    return f"INSERT INTO {table_name} ({', '.join(cols)}){clause} VALUES ", f"({', '.join(values)})"
+
+
+def _column_defaults(cur, table_name: str) -> dict[str, str]:
+    """列名 → DEFAULT式（DEFAULTのある列のみ、生成列は除く）"""
+    cur.execute(
+        "SELECT a.attname, pg_get_expr(d.adbin, d.adrelid) FROM pg_attrdef d"
+        " JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum"
+        " WHERE d.adrelid = %s::regclass AND a.attgenerated = ''",
+        (table_name,),
+    )
+    return dict(cur.fetchall())
+
+
+def _execute_fixed(cur, statement: tuple[str, str], cols: tuple[str, ...], rows: list[dict]) -> None:
+    """全行を同じ列の並びにそろえ、PREPARED_BATCH_ROWS行ずつの複数行VALUESにしてexecutemanyで送る
+
+    文の形は「PREPARED_BATCH_ROWS行」と「端数の1行」の2つだけなので、どちらもプリペアされる。
+    """
+    if not rows:
+        return
+    head, row_sql = statement
+    values = [tuple(row.get(c) for c in cols) for row in rows]
+    per = max(1, min(PREPARED_BATCH_ROWS, MAX_BIND_PARAMS // len(cols)))
+    full = len(values) - len(values) % per
+
+    if full:
+        cur.executemany(
+            head + ", ".join([row_sql] * per),
+            [tuple(v for value in values[i:i + per] for v in value) for i in range(0, full, per)],
+        )
+    if full < len(values):
+        cur.executemany(head + row_sql, values[full:])
+
+
+def _copy_rows(cur, table_name: str, rows: Iterable[dict]) -> int:
+    """COPY FROM STDINで投入し、件数を返す
+
+    INSERTと同じくNULL列は省略してDEFAULTを効かせるため、
+    COPY_BATCH_SIZE件ごとに非NULL列の組み合わせでまとめてCOPYを流す。
+    """
+    count = 0
+
+    for batch in chunked(rows, COPY_BATCH_SIZE):
+        for cols, values in _group_by_shape(batch).items():
+            with cur.copy(_copy_sql(table_name, cols)) as copy:
+                for value in values:
+                    copy.write_row(value)
+            count += len(values)
 
     return count
 
 
+def _group_by_shape(rows: Iterable[dict]) -> dict[tuple[str, ...], list[tuple]]:
+    """非NULL列の組み合わせごとに値タプルをまとめる"""
+    groups: dict[tuple[str, ...], list[tuple]] = {}
+    for row in rows:
+        cols = tuple(k for k, v in row.items() if v is not None)
+        groups.setdefault(cols, []).append(tuple(row[c] for c in cols))
+    return groups
+
+
+def _group_indices_by_shape(rows: list[dict]) -> dict[tuple[str, ...], list[int]]:
+    """非NULL列の組み合わせごとに行インデックスをまとめる"""
+    groups: dict[tuple[str, ...], list[int]] = {}
+    for i, row in enumerate(rows):
+        cols = tuple(k for k, v in row.items() if v is not None)
+        groups.setdefault(cols, []).append(i)
+    return groups
+
+
+def _insert_sql(table_name: str, cols: tuple[str, ...]) -> str:
+    placeholders = ["%s"] * len(cols)
+    return f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES ({', '.join(placeholders)})"
+
+
+def _copy_sql(table_name: str, cols: tuple[str, ...]) -> str:
+    return f"COPY {table_name} ({', '.join(cols)}) FROM STDIN"
+
+
 def _sql_value(value) -> str:
     """Python値をSQL値に変換"""
     if value is None:
@@ -0,0 +1,202 @@
+"""マスタ参照による名前→ID変換（type: lookup）
+
+列定義の例:
+    - csv: 国
+      db: country_id
+      type: lookup
+      lookup: { table: m_countries, key: country_name, value: country_id }
+
+チャンクごとに未解決の名前だけを `WHERE key = ANY(%s)` の1クエリでまとめて引き、
+結果はプロセス内にキャッシュする。cache_dir を指定すると、TTL付きでディスクにも残す。
+マスタにない名前はバリデーションの段階でCSVの行番号つきのエラーにする（pipeline.process_chunks）。
+"""
+
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from .reader import row_getter
+from .validator import SUMMARY_VALUE
+
+
+@dataclass(frozen=True)
+class LookupSpec:
+    """参照先（table.key → table.value）"""
+
+    table: str
+    key: str
+    value: str
+
+    @property
+    def cache_name(self) -> str:
+        return f"{self.table}.{self.key}.{self.value}"
+
+
+def lookup_columns(config: dict) -> dict[str, list[tuple[str, LookupSpec]]]:
+    """テーブル名 → [(DB列名, 参照先), ...]（親テーブルと関連テーブル）"""
+    tables = [(config["table"], config["columns"])]
+    tables += [(rel["table"], rel["columns"]) for rel in config.get("related_tables", [])]
+
+    result = {}
+    for table_name, col_defs in tables:
+        specs = [
+            (c["db"], LookupSpec(**c["lookup"]))
+            for c in col_defs
+            if c.get("type") == "lookup"
+        ]
+        if specs:
+            result[table_name] = specs
+    return result
+
+
+def lookup_defs(config: dict) -> list[dict]:
+    """lookup列の列定義（親テーブル・関連テーブルの順）"""
+    col_defs = list(config["columns"])
+    for rel in config.get("related_tables", []):
+        col_defs.extend(rel["columns"])
+    return [c for c in col_defs if c.get("type") == "lookup"]
+
+
+def lookup_names(valid, header: dict[str, int] | None, col_defs: list[dict]) -> list[list[str | None]]:
+    """正常行ごとのlookup列の値を列ごとに返す（strip済み、空はNone）
+
+    header がNoneの場合、valid は Parquet / Arrow のRecordBatch。
+    """
+    columns = [c["csv"] for c in col_defs]
+    if header is None:
+        names = set(valid.schema.names)
+        header = {c: i for i, c in enumerate(columns) if c in names}
+        valid = list(zip(*(valid.column(c).to_pylist() for c in header))) if header else [()] * len(valid)
+
+    values = list(zip(*map(row_getter(header, columns), valid))) or [()] * len(columns)
+    return [[(v or "").strip() or None for v in column] for column in values]
+
+
+def missing_message(table: str, key: str, value: str) -> str:
+    return f"{table}.{key} に存在しない値: {value}"
+
+
+class LookupResolver:
+    """lookup列の名前をマスタで引き、検査とIDへの置き換えを行う
+
+    lookups = LookupResolver(config, db_url)
+    failed, errors = lookups.check(names, row_numbers)  # バリデーション（lookup_names の値）
+    lookups.resolve(records, related)  # 検査済みのチャンクを名前からIDへ置き換える
+    lookups.close()  # 接続を閉じ、参照結果をディスクキャッシュへ書き出す
+    """
+
+    def __init__(self, config: dict, db_url: str, cache_dir=None, ttl: float = 86400):
+        self._defs = lookup_defs(config)
+        self._columns = lookup_columns(config)
+        self._main_table = config["table"]
+        self._db_url = db_url
+        self._cache_dir = Path(cache_dir) if cache_dir else None
+        self._ttl = ttl
+        self._cache: dict[LookupSpec, dict[str, object]] = {}
+        self._missing: dict[LookupSpec, set[str]] = {}  # マスタになかった名前（同じ実行では引き直さない）
+        self._conn = None
+        self.queries = 0  # DB問い合わせ回数
+
+        for col_def in self._defs:
+            spec = LookupSpec(**col_def["lookup"])
+            self._cache.setdefault(spec, self._load_disk_cache(spec))
+
+    def check(self, names: list[list[str | None]], row_numbers: list[int]) -> tuple[list[int], list[dict]]:
+        """マスタにない名前の行の位置と、その行のエラーを返す（未取得の名前は列ごとに1クエリで引く）"""
+        failed = set()
+        errors = []
+
+        for col_def, values in zip(self._defs, names):
+            spec = LookupSpec(**col_def["lookup"])
+            mapping = self._cache[spec]
+            missing = self._missing.setdefault(spec, set())
+            misses = {v for v in values if v is not None} - mapping.keys() - missing
+            if misses:
+                mapping.update(self._fetch(spec, misses))
+                missing.update(misses - mapping.keys())
+
+            for i, (value, row) in enumerate(zip(values, row_numbers)):
+                if value is not None and value not in mapping:
+                    failed.add(i)
+                    errors.append({
+                        "row": row,
+                        "column": col_def["csv"],
+                        "value": value,
+                        "message": missing_message(spec.table, spec.key, value),
+                        "check": missing_message(spec.table, spec.key, SUMMARY_VALUE),
+                    })
+
+        return sorted(failed), errors
+
+    def resolve(self, records: list[dict], related: dict[str, list[tuple[int, dict]]]) -> None:
+        """検査済みのチャンクのlookup列を名前からIDへ置き換える"""
+        self._resolve(self._main_table, records)
+        for rel_table, rel_records in related.items():
+            self._resolve(rel_table, [record for _, record in rel_records])
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        for spec, mapping in self._cache.items():
+            self._save_disk_cache(spec, mapping)
+
+    def _resolve(self, table_name: str, records: list[dict]) -> None:
+        for db_col, spec in self._columns.get(table_name, []):
+            mapping = self._cache[spec]
+            for r in records:
+                if r.get(db_col) is not None:
+                    r[db_col] = mapping[r[db_col]]
+
+    def _fetch(self, spec: LookupSpec, names: set[str]) -> dict[str, object]:
+        import psycopg
+
+        if self._conn is None:
+            self._conn = psycopg.connect(self._db_url, autocommit=True)
+
+        self.queries += 1
+        rows = self._conn.execute(
+            f"SELECT {spec.key}, {spec.value} FROM {spec.table} WHERE {spec.key} = ANY(%s)",
+            [list(names)],
+        ).fetchall()
+        return dict(rows)
+
+    # --- ディスクキャッシュ（接続先ごとに分ける） ---
+
+    def _cache_path(self, spec: LookupSpec) -> Path:
+        db_digest = hashlib.sha256(self._db_url.encode()).hexdigest()[:12]
+        return self._cache_dir / f"{spec.cache_name}.{db_digest}.json"
+
+    def _load_disk_cache(self, spec: LookupSpec) -> dict[str, object]:
+        if self._cache_dir is None:
+            return {}
+        path = self._cache_path(spec)
+        if not path.exists():
+            return {}
+
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if time.time() - data["fetched_at"] > self._ttl:
+            return {}
+        return data["mapping"]
+
+    def _save_disk_cache(self, spec: LookupSpec, mapping: dict[str, object]) -> None:
+        if self._cache_dir is None or not mapping:
+            return
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+        path = self._cache_path(spec)
+        fetched_at = time.time()
+        if path.exists():
+            # TTL内に読み込んだキャッシュへ追記しただけなら、取得時刻は元のまま
+            with open(path, encoding="utf-8") as f:
+                previous = json.load(f)
+            if time.time() - previous["fetched_at"] <= self._ttl:
+                fetched_at = previous["fetched_at"]
+
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": fetched_at, "mapping": mapping}, f, ensure_ascii=False)
+        tmp.replace(path)
@@ -0,0 +1,78 @@
+"""段階ごとの計測（--metrics json）"""
+
+import resource
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+@dataclass
+class StageMetrics:
+    """1段階分の累積計測値"""
+
+    wall: float = 0.0  # 経過時間（秒）
+    cpu: float = 0.0  # CPU時間（秒、並列時はワーカー側の合計）
+    rows_in: int = 0
+    rows_out: int = 0
+
+    def add(self, wall: float, cpu: float, rows_in: int = 0, rows_out: int = 0) -> None:
+        self.wall += wall
+        self.cpu += cpu
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+
+    def as_dict(self) -> dict:
+        return {
+            "wall_sec": round(self.wall, 6),
+            "cpu_sec": round(self.cpu, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_sec": round(self.rows_in / self.wall, 1) if self.wall > 0 else None,
+        }
+
+
+@contextmanager
+def timed(stage: StageMetrics):
+    """with内の経過時間とCPU時間を stage に加算する（件数は呼び出し側で加算）"""
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield stage
+    finally:
+        stage.add(time.perf_counter() - wall, time.process_time() - cpu)
+
+
+class CountingCursor:
+    """DBへの往復回数を数えるカーソルのラッパー（同期・非同期どちらのカーソルにも使える）
+
+    execute / executemany（パイプラインで1回の送信）/ copy をそれぞれ1往復と数える。
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.round_trips = 0
+
+    def execute(self, *args, **kwargs):
+        self.round_trips += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self.round_trips += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def copy(self, *args, **kwargs):
+        self.round_trips += 1
+        return self._cursor.copy(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+def peak_rss_mb() -> dict:
+    """本体プロセスと子プロセス（--workers）の最大RSS（MB、Linuxの単位KBから換算）"""
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
@@ -0,0 +1,30 @@
+"""プロセスプールによる並列処理"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+
+def imap_ordered(
+    fn: Callable,
+    items: Iterable,
+    workers: int,
+    initializer: Callable | None = None,
+    initargs: tuple = (),
+) -> Iterator:
+    """itemsをプロセスプールで処理し、入力順に結果を返す
+
+    ProcessPoolExecutor.map は入力を先に全件投入してしまうため、
+    処理中の件数を workers * 2 までに抑えてメモリ使用量を一定に保つ。
+    """
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, initargs=initargs
+    ) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,242 @@
+"""ストリーミング処理（CSV読み込み → バリデーション → 変換）
+
+ファイル全体をリスト化せず、chunk_size行ずつ流すことでメモリ使用量を一定に保つ。
+"""
+
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator
+
+from . import CHUNK_SIZE
+from .metrics import StageMetrics, timed
+from .columnar import is_columnar
+from .dedup import DedupIndex, dedup_columns, drop_rows, row_keys
+from .lookup import LookupResolver, lookup_defs, lookup_names
+from .reader import read_rows
+from .transformer import transform_related, transform_rows
+from .validator import ColumnRule, compile_plan, validate_csv
+
+
+@dataclass
+class PipelineStats:
+    """パイプラインの通過件数と段階ごとの計測値"""
+
+    rows_read: int = 0
+    rows_valid: int = 0
+    decode: StageMetrics = field(default_factory=StageMetrics)
+    validate: StageMetrics = field(default_factory=StageMetrics)
+    transform: StageMetrics = field(default_factory=StageMetrics)
+
+
+def read_chunks(
+    filepath, chunk_size: int = CHUNK_SIZE, skip_rows: int = 0
+) -> Iterator[tuple[int, list[tuple[str, ...]], dict[str, int]]]:
+    """CSVをchunk_size行ずつ読み込む（先頭行の行番号, 行タプルのリスト, ヘッダー索引）
+
+    文字コード（BOM付きUTF-8 / UTF-8 / CP932）は自動判定する（reader.read_rows参照）。
+    Parquet / Arrow IPC の場合は行タプルの代わりにRecordBatchを流し、ヘッダー索引はNoneにする
+    （columnar.read_batches参照）。
+    skip_rows: 先頭から読み飛ばすデータ行数（--resume 用）
+    """
+    if is_columnar(filepath):
+        from .columnar import read_batches
+
+        return read_batches(filepath, chunk_size, skip_rows)
+    return read_rows(filepath, chunk_size, skip_rows)
+
+
+def process_chunks(
+    chunks: Iterable[tuple[int, list[tuple[str, ...]], dict[str, int]]],
+    config: dict,
+    errors: list[dict],
+    stats: PipelineStats,
+    *,
+    transform: bool = True,
+    workers: int = 1,
+    plan: tuple[ColumnRule, ...] | None = None,
+    dedup: DedupIndex | None = None,
+    lookups: LookupResolver | None = None,
+) -> Iterator[tuple[list[dict], dict]]:
+    """チャンクごとにバリデーション・変換し、元の行順で流す（エラーはerrorsに追記）
+
+    流す値は（親レコード, 関連テーブルのレコード）のタプル。
+    transform=False の場合は検査のみ行い、空の結果を流す（事前検査用）。
+    workers>1 の場合はプロセスプールで並列処理する。
+    plan: コンパイル済みのバリデーションプラン（省略時はconfigからコンパイル）
+    dedup: 指定時はキーが重複した行をエラーにして取り除く（元の行順で判定するため本体側で行う）
+    lookups: 指定時はlookup列の名前がマスタにない行をエラーにして取り除き、残りをIDへ置き換える
+        （DB接続とキャッシュを共有するため本体側で行う）
+    """
+    chunks = _timed_chunks(chunks, stats.decode)
+    if plan is None:
+        plan = compile_plan(config)
+    if workers > 1:
+        from .parallel import imap_ordered  # プロセスプールは並列時のみ読み込む
+
+        results = imap_ordered(
+            _run_chunk, chunks, workers,
+            initializer=_init_worker, initargs=(config, plan, transform),
+        )
+    else:
+        results = (_process_chunk(chunk, config, plan, transform) for chunk in chunks)
+
+    for rows_read, rows_valid, chunk_errors, output, timings, checks in results:
+        if checks is not None:
+            dropped, check_errors = _check_rows(checks, dedup, lookups)
+            if dropped:
+                chunk_errors = sorted(chunk_errors + check_errors, key=lambda e: e["row"])
+                rows_valid -= len(dropped)
+                if transform:
+                    output = drop_rows(*output, dropped)
+        if lookups is not None and transform:
+            lookups.resolve(*output)
+        stats.rows_read += rows_read
+        stats.rows_valid += rows_valid
+        validate_wall, validate_cpu, transform_wall, transform_cpu = timings
+        stats.validate.add(validate_wall, validate_cpu, rows_read, rows_valid)
+        if transform:
+            stats.transform.add(transform_wall, transform_cpu, rows_valid, len(output[0]))
+        errors.extend(chunk_errors)
+        yield output
+
+
+def _check_rows(checks, dedup: DedupIndex | None, lookups: LookupResolver | None) -> tuple[list[int], list[dict]]:
+    """本体側で行う検査（lookup → 重複の順）。取り除く行の位置と、そのエラーを返す"""
+    row_numbers, keys, names = checks
+    dropped = set()
+    errors = []
+    if lookups is not None and names is not None:
+        failed, lookup_errors = lookups.check(names, row_numbers)
+        dropped.update(failed)
+        errors += lookup_errors
+    if dedup is not None and keys is not None:
+        # マスタにない行は取り除くため、重複判定の初出にしない
+        keys = [None if i in dropped else key for i, key in enumerate(keys)]
+        duplicates, dup_errors = dedup.check(keys, row_numbers)
+        dropped.update(duplicates)
+        errors += dup_errors
+    return sorted(dropped), errors
+
+
+def _timed_chunks(chunks: Iterable[tuple], stage: StageMetrics):
+    """チャンクの読み込み（CSVデコード）にかかった時間を stage に加算しながら流す"""
+    it = iter(chunks)
+    while True:
+        with timed(stage):
+            chunk = next(it, None)
+        if chunk is None:
+            return
+        stage.rows_in += len(chunk[1])
+        stage.rows_out += len(chunk[1])
+        yield chunk
+
+
+def check_file(
+    filepath,
+    config: dict,
+    errors: list[dict],
+    stats: PipelineStats,
+    chunk_size: int = CHUNK_SIZE,
+    workers: int = 1,
+    skip_rows: int = 0,
+    plan: tuple[ColumnRule, ...] | None = None,
+    dedup: DedupIndex | None = None,
+    lookups: LookupResolver | None = None,
+) -> None:
+    """CSV全行をバリデーションのみ行う（投入前の事前検査）"""
+    chunks = read_chunks(filepath, chunk_size, skip_rows)
+    for _ in process_chunks(
+        chunks, config, errors, stats, transform=False, workers=workers, plan=plan, dedup=dedup, lookups=lookups
+    ):
+        pass
+
+
+def iter_batches(
+    filepath,
+    config: dict,
+    errors: list[dict],
+    stats: PipelineStats,
+    chunk_size: int = CHUNK_SIZE,
+    workers: int = 1,
+    skip_rows: int = 0,
+    plan: tuple[ColumnRule, ...] | None = None,
+    dedup: DedupIndex | None = None,
+    lookups: LookupResolver | None = None,
+) -> Iterator[tuple[list[dict], dict[str, list[tuple[int, dict]]]]]:
+    """チャンクごとに（親レコード, 関連テーブルのレコード）を流す
+
+    関連テーブルのレコードは親レコードのインデックスを持つ（transform_related参照）。
+    statsは流したチャンクまでの件数を表すため、チャンク境界でのコミット位置に使える。
+    """
+    chunks = read_chunks(filepath, chunk_size, skip_rows)
+    yield from process_chunks(
+        chunks, config, errors, stats, workers=workers, plan=plan, dedup=dedup, lookups=lookups
+    )
+
+
+def _process_chunk(chunk, config, plan, transform):
+    """1チャンク分の処理（読込行数, 正常行数, エラー, 出力行, 計測値, 本体側の検査用の値）
+
+    計測値は (検査の経過時間, 検査のCPU時間, 変換の経過時間, 変換のCPU時間)。
+    ワーカープロセスで実行された場合もその中で測った値を返す。
+    本体側の検査用の値は dedup_key か lookup列がある場合のみ
+    (正常行の行番号, 正常行のキー or None, 正常行のlookup列の値 or None)、どちらもなければNone。
+    """
+    row_num, rows, header = chunk
+    wall, cpu = time.perf_counter(), time.process_time()
+    if header is None:
+        # Parquet / Arrow は列単位で検査し、変換する場合だけ正常行をタプルにする
+        from .columnar import batch_rows, validate_batch
+
+        valid, chunk_errors = validate_batch(rows, config, row_num)
+    else:
+        valid, chunk_errors = validate_csv(rows, config, start_row=row_num, plan=plan, header=header)
+    validated_wall, validated_cpu = time.perf_counter(), time.process_time()
+    if transform:
+        if header is None:
+            valid, header = batch_rows(valid, config)
+        output = (transform_rows(valid, config, header), transform_related(valid, config, header))
+    else:
+        output = ([], {})
+    timings = (
+        validated_wall - wall,
+        validated_cpu - cpu,
+        time.perf_counter() - validated_wall,
+        time.process_time() - validated_cpu,
+    )
+
+    checks = None
+    key_defs = dedup_columns(config)
+    lookup_cols = lookup_defs(config)
+    if key_defs or lookup_cols:
+        failed = {e["row"] for e in chunk_errors}
+        row_numbers = [n for n in range(row_num, row_num + len(rows)) if n not in failed]
+        checks = (
+            row_numbers,
+            row_keys(valid, header, key_defs) if key_defs else None,
+            lookup_names(valid, header, lookup_cols) if lookup_cols else None,
+        )
+    return len(rows), len(valid), chunk_errors, output, timings, checks
+
+
+# --- ワーカープロセス側（プランは初期化時に1回だけ受け取る） ---
+
+_worker_state: dict = {}
+
+
+def _init_worker(config: dict, plan: tuple[ColumnRule, ...], transform: bool):
+    _worker_state.update(config=config, plan=plan, transform=transform)
+
+
+def _run_chunk(chunk):
+    return _process_chunk(
+        chunk, _worker_state["config"], _worker_state["plan"], _worker_state["transform"]
+    )
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """イテラブルをsize件ずつのリストに区切る"""
+    it = iter(items)
+    while chunk := list(islice(it, size)):
+        yield chunk
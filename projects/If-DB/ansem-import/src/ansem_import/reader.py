@@ -0,0 +1,114 @@
+"""CSVの読み込み層（メモリマップ・文字コード判定・タプル行）
+
+ファイルをメモリマップし、ブロック単位でデコードして csv.reader に渡す。
+行は辞書ではなくタプルで返し、列名は全行で共有するヘッダー索引（列名 → 位置）で引く。
+Excelから書き出したShift_JIS（CP932）のCSVも、先頭の非ASCII部分から判定して読める。
+"""
+
+import codecs
+import csv
+import io
+import mmap
+import re
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Iterator
+
+_BLOCK_SIZE = 1024 * 1024
+_SAMPLE_SIZE = 64 * 1024
+_NON_ASCII = re.compile(rb"[\x80-\xff]")
+
+
+def detect_encoding(buf) -> str:
+    """BOM / UTF-8 / CP932 を判定する（bufはbytesまたはmmap）
+
+    先頭がASCIIだけのファイルもあるため、最初の非ASCIIバイトから標本を取って判定する。
+    """
+    if buf[:3] == codecs.BOM_UTF8:
+        return "utf-8-sig"
+
+    found = _NON_ASCII.search(buf)
+    if found is None:
+        return "utf-8"
+
+    sample = bytes(buf[found.start():found.start() + _SAMPLE_SIZE])
+    try:
+        # 標本の末尾で文字が切れていても失敗しないよう、逐次デコーダーで final にしない
+        codecs.getincrementaldecoder("utf-8")().decode(sample)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp932"
+
+
+def read_rows(
+    filepath, chunk_size: int, skip_rows: int = 0, encoding: str | None = None
+) -> Iterator[tuple[int, list[tuple[str, ...]], dict[str, int]]]:
+    """CSVをchunk_size行ずつ読み込む（先頭行の行番号, 行タプルのリスト, ヘッダー索引）
+
+    行は列数がヘッダーより少なければ空文字で埋める。空行は読み飛ばす。
+    skip_rows: 先頭から読み飛ばすデータ行数（--resume 用）
+    encoding: 省略時は detect_encoding で判定する
+    """
+    with open(filepath, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # 空ファイル
+
+        with buf:
+            reader = csv.reader(_iter_lines(buf, encoding or detect_encoding(buf)))
+            rows = (row for row in reader if row)
+            header = next(rows, None)
+            if header is None:
+                return
+            index = {name: i for i, name in enumerate(header)}
+            width = len(header)
+
+            for _ in islice(rows, skip_rows):
+                pass
+            row_num = 2 + skip_rows  # ヘッダーが1行目なので2行目から
+            while chunk := [
+                tuple(row) if len(row) >= width else tuple(row + [""] * (width - len(row)))
+                for row in islice(rows, chunk_size)
+            ]:
+                yield row_num, chunk, index
+                row_num += len(chunk)
+
+
+def row_getter(header: dict[str, int] | None, columns: list[str]) -> Callable:
+    """行から columns の値をこの順のタプルで取り出す関数を返す
+
+    header がなければ行を辞書として扱う。ヘッダーにない列は空文字になる。
+    """
+    if header is None:
+        return lambda row: tuple(row.get(c, "") for c in columns)
+
+    if not columns:
+        return lambda row: ()
+    if all(c in header for c in columns):
+        getter = itemgetter(*(header[c] for c in columns))
+        if len(columns) == 1:
+            return lambda row: (getter(row),)
+        return getter
+
+    indices = [header.get(c) for c in columns]
+    return lambda row: tuple("" if i is None else row[i] for i in indices)
+
+
+def _iter_lines(buf, encoding: str) -> Iterator[str]:
+    """メモリマップをブロックごとにデコードし、改行を残した行を流す
+
+    改行は open() の既定と同じく \\r\\n・\\r を \\n にそろえる（ブロック境界で切れた \\r\\n も含む）。
+    splitlines は \\x1c 等でも区切ってしまうため、そろえた後の \\n でだけ分割する。
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+    pending = ""
+    for pos in range(0, len(buf), _BLOCK_SIZE):
+        lines = (pending + decoder.decode(buf[pos:pos + _BLOCK_SIZE])).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
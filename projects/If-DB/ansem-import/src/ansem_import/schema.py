@@ -0,0 +1,243 @@
+"""テーブル定義とDBスキーマの照合（schema check / 投入前の検査）
+
+information_schema.columns を1クエリで取得し、投入先DBごとにローカルへキャッシュする
+（既定は `$XDG_CACHE_HOME/ansem-import/schema.<DBのハッシュ>.json`、有効期間つき）。
+キャッシュを使うのは import-data の投入前の検査だけで、schema check は常にDBから取得する。
+列の存在・値の型・NOT NULL制約をテーブル定義と照合し、CSVを読む前に設定の誤りを見つける。
+キャッシュを使った照合で問題が見つかった場合は、DB側が直っている可能性があるため取り直して照合し直す。
+"""
+
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .ledger import db_key
+
+SCHEMA_CACHE_TTL = 3600
+
+_NUMERIC_TYPES = {"smallint", "integer", "bigint", "numeric", "real", "double precision"}
+_TEXT_TYPES = {"text", "character varying", "character"}
+_BOOLEAN_TEXT = {"t", "f", "true", "false", "y", "n", "yes", "no", "on", "off", "1", "0"}
+
+
+@dataclass(frozen=True)
+class DbColumn:
+    """DBの列の情報（information_schema.columns から）"""
+
+    data_type: str
+    nullable: bool
+    has_default: bool  # DEFAULT・IDENTITY・生成列のいずれかで値が入る
+    generated_always: bool  # GENERATED ALWAYS（値を指定できない）
+
+
+@dataclass
+class SchemaIssue:
+    """照合で見つかった問題（fatal=False は警告）"""
+
+    table: str
+    column: str | None
+    message: str
+    fatal: bool = True
+
+    def __str__(self) -> str:
+        target = f"{self.table}.{self.column}" if self.column else self.table
+        return f"{target}: {self.message}"
+
+
+def default_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "ansem-import"
+
+
+def verify_schema(config: dict, db_url: str, cache_dir=None, ttl: float = SCHEMA_CACHE_TTL) -> list[SchemaIssue]:
+    """テーブル定義をDBスキーマと照合する（キャッシュが有効ならDBへ接続しない）"""
+    schema = _read_cache(_cache_path(cache_dir, db_url), ttl)
+    if schema is not None:
+        issues = check_table_def(config, schema)
+        if not any(issue.fatal for issue in issues):
+            return issues
+
+    return check_table_def(config, refresh_schema(db_url, cache_dir))
+
+
+def refresh_schema(db_url: str, cache_dir=None) -> dict[str, dict[str, DbColumn]]:
+    """DBからスキーマを取得し、キャッシュも書き換える"""
+    schema = fetch_schema(db_url)
+    _write_cache(_cache_path(cache_dir, db_url), schema)
+    return schema
+
+
+def fetch_schema(db_url: str) -> dict[str, dict[str, DbColumn]]:
+    """search_path上のテーブルの列情報（テーブル名・スキーマ名付きのテーブル名 → 列名 → 列情報）
+
+    同名のテーブルが複数のスキーマにある場合、スキーマなしの名前は search_path で先のものを指す。
+    """
+    import psycopg
+
+    with psycopg.connect(db_url) as conn:
+        rows = conn.execute(
+            "SELECT table_schema, table_name, column_name, data_type, is_nullable = 'YES',"
+            " column_default IS NOT NULL OR is_identity = 'YES' OR is_generated <> 'NEVER',"
+            " identity_generation = 'ALWAYS' OR is_generated = 'ALWAYS'"
+            " FROM information_schema.columns WHERE table_schema = ANY(current_schemas(false))"
+            " ORDER BY array_position(current_schemas(false), table_schema::name), table_name, ordinal_position"
+        ).fetchall()
+
+    schema: dict[str, dict[str, DbColumn]] = {}
+    for table_schema, table_name, column_name, data_type, nullable, has_default, generated in rows:
+        column = DbColumn(data_type, nullable, has_default, bool(generated))
+        schema.setdefault(f"{table_schema}.{table_name}", {})[column_name] = column
+    for qualified in list(schema):
+        schema.setdefault(qualified.split(".", 1)[1], schema[qualified])
+    return schema
+
+
+def check_table_def(config: dict, schema: dict[str, dict[str, DbColumn]]) -> list[SchemaIssue]:
+    """テーブル定義をスキーマと照合する（親テーブル・関連テーブル・lookupの参照先）"""
+    issues = []
+    tables = [(config["table"], config["columns"], [])]
+    for rel in config.get("related_tables", []):
+        tables.append((rel["table"], rel["columns"], [rel["foreign_key"]]))
+
+    for table_name, col_defs, linked in tables:
+        columns = schema.get(table_name)
+        if columns is None:
+            issues.append(SchemaIssue(table_name, None, "テーブルがありません"))
+            continue
+
+        provided = set(linked)
+        for col_def in col_defs:
+            values = {col_def["db"]: _mapped_values(col_def)}
+            values.update({k: [v] for k, v in col_def.get("extra", {}).items()})
+            for db_col, col_values in values.items():
+                provided.add(db_col)
+                issues.extend(_check_column(table_name, columns, db_col, col_def["csv"], col_values))
+            if col_def.get("type") == "lookup":
+                issues.extend(_check_lookup(col_def, schema))
+        for db_col in linked:
+            if db_col not in columns:
+                issues.append(SchemaIssue(table_name, db_col, "外部キーの列がありません"))
+
+        for db_col, column in columns.items():
+            if column.nullable or column.has_default:
+                continue
+            if db_col not in provided:
+                issues.append(SchemaIssue(table_name, db_col, "NOT NULL（DEFAULTなし）の列がテーブル定義にありません"))
+
+    if config["table"] in schema:
+        issues.extend(_check_not_null(config["table"], schema[config["table"]], config["columns"]))
+    if "primary_key" in config and config["table"] in schema and config["primary_key"] not in schema[config["table"]]:
+        issues.append(SchemaIssue(config["table"], config["primary_key"], "primary_key の列がありません"))
+    return issues
+
+
+def _check_column(table_name: str, columns: dict, db_col: str, csv_col: str, values: list) -> list[SchemaIssue]:
+    column = columns.get(db_col)
+    if column is None:
+        return [SchemaIssue(table_name, db_col, f"列がありません（CSV列「{csv_col}」）")]
+    if column.generated_always:
+        return [SchemaIssue(table_name, db_col, "GENERATED ALWAYS の列には値を入れられません")]
+
+    issues = []
+    for value in values:
+        if not _fits(value, column.data_type):
+            issues.append(SchemaIssue(
+                table_name, db_col, f"値 {value!r} を {column.data_type} 型の列に入れられません（CSV列「{csv_col}」）"
+            ))
+    return issues
+
+
+def _check_not_null(table_name: str, columns: dict, col_defs: list[dict]) -> list[SchemaIssue]:
+    """NOT NULL（DEFAULTなし）の列に、空になりうるCSV列が対応していないか（警告）
+
+    関連テーブルは値のある列だけがレコードになるため、親テーブルだけを見る。
+    """
+    issues = []
+    for col_def in col_defs:
+        column = columns.get(col_def["db"])
+        if column is None or column.nullable or column.has_default:
+            continue
+        if col_def.get("required"):
+            continue
+        issues.append(SchemaIssue(
+            table_name, col_def["db"],
+            f"NOT NULL（DEFAULTなし）ですが「{col_def['csv']}」が空の行は投入時にエラーになります"
+            "（required: true を推奨）",
+            fatal=False,
+        ))
+    return issues
+
+
+def _check_lookup(col_def: dict, schema: dict) -> list[SchemaIssue]:
+    spec = col_def["lookup"]
+    columns = schema.get(spec["table"])
+    if columns is None:
+        return [SchemaIssue(spec["table"], None, f"lookup の参照先テーブルがありません（CSV列「{col_def['csv']}」）")]
+    return [
+        SchemaIssue(spec["table"], spec[name], f"lookup の {name} の列がありません（CSV列「{col_def['csv']}」）")
+        for name in ("key", "value")
+        if spec[name] not in columns
+    ]
+
+
+def _mapped_values(col_def: dict) -> list:
+    """変換後に入る値のうち、型を照合できるもの（ドロップダウン・booleanの対応表の値）"""
+    if col_def.get("type") in ("dropdown", "boolean"):
+        return list(col_def.get("mapping", {}).values())
+    return []
+
+
+def _fits(value, data_type: str) -> bool:
+    """値がその型の列に入るか（サーバー側の型変換で受け付けられるか）"""
+    if isinstance(value, bool):
+        return data_type == "boolean" or data_type in _TEXT_TYPES
+    if isinstance(value, (int, float)):
+        return data_type in _NUMERIC_TYPES or data_type in _TEXT_TYPES
+    if isinstance(value, str):
+        if data_type in _NUMERIC_TYPES:
+            try:
+                float(value)
+            except ValueError:
+                return False
+        elif data_type == "boolean":
+            return value.strip().lower() in _BOOLEAN_TEXT
+    return True
+
+
+def _cache_path(cache_dir, db_url: str) -> Path:
+    return (Path(cache_dir) if cache_dir else default_cache_dir()) / f"schema.{db_key(db_url)}.json"
+
+
+def _read_cache(path: Path, ttl: float) -> dict[str, dict[str, DbColumn]] | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if time.time() - data["fetched_at"] > ttl:
+            return None
+        return {
+            table: {name: DbColumn(**column) for name, column in columns.items()}
+            for table, columns in data["tables"].items()
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        return None  # 期限切れ・壊れたキャッシュは取り直す
+
+
+def _write_cache(path: Path, schema: dict[str, dict[str, DbColumn]]) -> None:
+    """キャッシュを書く（書けない環境では何もしない）"""
+    data = {
+        "fetched_at": time.time(),
+        "tables": {
+            table: {name: asdict(column) for name, column in columns.items()}
+            for table, columns in schema.items()
+        },
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        tmp.replace(path)
+    except OSError:
+        pass
@@ -0,0 +1,204 @@
+"""複数接続への振り分け投入（--db-connections）
+
+変換済みのチャンクを connections 本の接続へ振り分け、それぞれ投入先ごとの
+ステージング表（UNLOGGED）へCOPYする。全接続のCOPYが終わったら、1つの接続の
+1トランザクションでステージング表から本表へ INSERT ... SELECT で移すため、
+本表への反映は全件か0件のどちらかになる（execute_insert と同じ原子性）。
+
+関連テーブルの外部キーは、移す直前に親の主キーを順序（IDENTITY / serial）から
+行番号順に採番してステージング表に書き込み、その値で親と関連テーブルをつなぐ。
+"""
+
+import asyncio
+import secrets
+from typing import Iterable
+
+from .async_loader import _DONE, _produce
+from .loader import COPY_BATCH_SIZE, LoadResult, _column_defaults, _fixed_columns, primary_key_sequence
+from .metrics import CountingCursor, StageMetrics, timed
+from .pipeline import chunked
+
+STAGING_PREFIX = "_ansem_stage"
+
+
+def load_batches_sharded(
+    batches: Iterable[tuple[list[dict], dict[str, list[tuple[int, dict]]]]],
+    config: dict,
+    db_url: str,
+    *,
+    with_related: bool = False,
+    connections: int = 2,
+    metrics: StageMetrics | None = None,
+) -> LoadResult:
+    """チャンクを connections 本の接続でステージング表へCOPYし、最後に1トランザクションで本表へ移す
+
+    失敗した場合は本表に何も残さず、ステージング表も削除する。
+    metrics: 変換とCOPYが重なるため、投入全体の経過時間を加算する
+    """
+    import psycopg
+
+    metrics = metrics if metrics is not None else StageMetrics()
+    result = LoadResult()
+    suffix = secrets.token_hex(4)
+    stages = _staging_tables(config, with_related, suffix)
+
+    with psycopg.connect(db_url, autocommit=True) as admin:
+        try:
+            with timed(metrics):
+                _create_staging(admin, config, stages)
+                try:
+                    asyncio.run(_copy_all(batches, stages, db_url, connections, result))
+                except ExceptionGroup as eg:
+                    # 同期版と同じ例外が見えるよう、最初に失敗したタスクの例外を送出する
+                    raise eg.exceptions[0] from eg
+                _promote(db_url, config, stages, result)
+        finally:
+            admin.execute(f"DROP TABLE IF EXISTS {', '.join(s['name'] for s in stages.values())}")
+
+    metrics.rows_in += result.count
+    metrics.rows_out += result.count
+    return result
+
+
+def _staging_tables(config: dict, with_related: bool, suffix: str) -> dict[str, dict]:
+    """投入先テーブル名 → ステージング表の定義（名前, 列, 行番号列）"""
+    stages = {
+        config["table"]: {
+            "name": f"{STAGING_PREFIX}_{config['table']}_{suffix}",
+            "cols": _fixed_columns(config["columns"]),
+            "row_col": "_row",
+        }
+    }
+    if with_related:
+        for rel in config.get("related_tables", []):
+            stages[rel["table"]] = {
+                "name": f"{STAGING_PREFIX}_{rel['table']}_{suffix}",
+                "cols": _fixed_columns(rel["columns"]),
+                "row_col": "_parent_row",
+                "foreign_key": rel["foreign_key"],
+            }
+    return stages
+
+
+def _create_staging(conn, config: dict, stages: dict[str, dict]) -> None:
+    """本表と同じ型の列＋行番号列を持つ、制約なしのステージング表を作る"""
+    for table_name, stage in stages.items():
+        conn.execute(
+            f"CREATE UNLOGGED TABLE {stage['name']} AS"
+            f" SELECT {', '.join(stage['cols'])} FROM {table_name} WITH NO DATA"
+        )
+        conn.execute(f"ALTER TABLE {stage['name']} ADD COLUMN {stage['row_col']} bigint")
+    if len(stages) > 1:
+        conn.execute(f"ALTER TABLE {stages[config['table']]['name']} ADD COLUMN _id bigint")
+
+
+async def _copy_all(batches, stages: dict[str, dict], db_url: str, connections: int, result: LoadResult) -> None:
+    import psycopg
+
+    queue = asyncio.Queue(maxsize=connections * 2)
+    conns = [await psycopg.AsyncConnection.connect(db_url) for _ in range(connections)]
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(_produce(_numbered(batches), queue, connections))
+            for conn in conns:
+                tg.create_task(_copy_worker(conn, stages, queue, result))
+
+        # ステージング表は他の接続から見えるようにコミットしておく（本表はまだ変更しない）
+        for conn in conns:
+            await conn.commit()
+        result.round_trips += len(conns)
+    finally:
+        for conn in conns:
+            await conn.close()
+
+
+def _numbered(batches):
+    """チャンクに先頭行の通し番号をつける（接続をまたいで親子をつなぐ行番号）"""
+    offset = 0
+    for records, related in batches:
+        yield offset, records, related
+        offset += len(records)
+
+
+async def _copy_worker(conn, stages: dict[str, dict], queue: asyncio.Queue, result: LoadResult) -> None:
+    """キューから取り出したチャンクを、1つの接続でステージング表へCOPYし続ける"""
+    async with conn.cursor() as raw_cur:
+        cur = CountingCursor(raw_cur)
+        main_table = next(iter(stages))
+        while (batch := await queue.get()) is not _DONE:
+            offset, records, related = batch
+            rows = ((record, offset + i) for i, record in enumerate(records))
+            await _copy_stage(cur, stages[main_table], rows)
+
+            for rel_table, rel_records in related.items():
+                if rel_table in stages:
+                    await _copy_stage(cur, stages[rel_table], ((r, offset + i) for i, r in rel_records))
+
+        result.round_trips += cur.round_trips
+
+
+async def _copy_stage(cur, stage: dict, rows) -> None:
+    """(レコード, 行番号) をステージング表へCOPYする（NULLもそのまま送る）"""
+    cols = stage["cols"]
+    sql = f"COPY {stage['name']} ({', '.join(cols)}, {stage['row_col']}) FROM STDIN"
+    for batch in chunked(rows, COPY_BATCH_SIZE):
+        async with cur.copy(sql) as copy:
+            for record, row in batch:
+                await copy.write_row((*(record.get(c) for c in cols), row))
+
+
+def _promote(db_url: str, config: dict, stages: dict[str, dict], result: LoadResult) -> None:
+    """ステージング表から本表へ、1トランザクションで行番号順に移す
+
+    NULLの列はDBのDEFAULT式で置き換える（列を省略した場合と同じ結果になる）。
+    """
+    import psycopg
+
+    table_name = config["table"]
+    main = stages[table_name]
+
+    with psycopg.connect(db_url) as conn, conn.cursor() as raw_cur:
+        cur = CountingCursor(raw_cur)
+        cols = list(main["cols"])
+        values = _with_defaults(cur, table_name, cols, "s")
+
+        if len(stages) > 1:
+            primary_key = config["primary_key"]
+            sequence = primary_key_sequence(cur, table_name, primary_key, "--db-connections")
+            cur.execute(
+                f"UPDATE {main['name']} s SET _id = n.id"
+                f" FROM (SELECT _row, nextval(%s) AS id FROM (SELECT _row FROM {main['name']} ORDER BY _row) o) n"
+                " WHERE s._row = n._row",
+                (sequence,),
+            )
+            cols.insert(0, primary_key)
+            values.insert(0, "s._id")
+            overriding = " OVERRIDING SYSTEM VALUE"
+        else:
+            overriding = ""
+
+        cur.execute(
+            f"INSERT INTO {table_name} ({', '.join(cols)}){overriding}"
+            f" SELECT {', '.join(values)} FROM {main['name']} s ORDER BY s._row"
+        )
+        result.count = cur.rowcount
+
+        for rel_table, stage in list(stages.items())[1:]:
+            rel_cols = list(stage["cols"])
+            rel_values = _with_defaults(cur, rel_table, rel_cols, "r")
+            cur.execute(
+                f"INSERT INTO {rel_table} ({stage['foreign_key']}, {', '.join(rel_cols)})"
+                f" SELECT p._id, {', '.join(rel_values)} FROM {stage['name']} r"
+                f" JOIN {main['name']} p ON p._row = r._parent_row ORDER BY r._parent_row"
+            )
+            if cur.rowcount:
+                result.related[rel_table] = cur.rowcount
+
+        conn.commit()
+        result.round_trips += cur.round_trips + 1
+
+
+def _with_defaults(cur, table_name: str, cols: list[str], alias: str) -> list[str]:
+    defaults = _column_defaults(cur, table_name)
+    return [f"COALESCE({alias}.{c}, {defaults[c]})" if c in defaults else f"{alias}.{c}" for c in cols]
@@ -0,0 +1,371 @@
+"""ステージング表での集合検査と投入（--load-mode staging）
+
+ファイルの値をstripしただけの文字列のまま一時表へCOPYし、テーブル定義の検査を
+一時表全体に対するSQLとしてまとめて実行する。行単位の validate_csv ではできない
+行をまたぐ検査（dedup_key のファイル内・既存データとの重複、外部キー（ドロップダウンのID等）や
+lookup の参照先の存在）もあわせて行い、エラーはCSVの行番号つきで返す。
+正常な行は、ドロップダウン→ID等の変換もSQLで行いながら1文で本表・関連テーブルへ移す。
+"""
+
+from .columnar import _checked_columns, batch_rows
+from .dedup import dedup_columns, duplicate_message, key_label
+from .loader import LoadResult, _sql_value, primary_key_sequence
+from .lookup import missing_message
+from .metrics import CountingCursor, StageMetrics, timed
+from .pipeline import PipelineStats, read_chunks
+from .reader import row_getter
+from .validator import SUMMARY_VALUE, _check_digits, _check_dropdown, _check_email, check_summary, required_message
+
+RAW_TABLE = "_ansem_raw"
+ERROR_TABLE = "_ansem_errors"
+_FETCH_SIZE = 10000
+
+# validator._EMAIL_RE / digits:N と同じ判定をPostgreSQLの正規表現で書いたもの
+_EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+_DIGITS_PATTERN = "^[[:digit:]]{%d}$"
+
+
+def load_staged(
+    filepath,
+    config: dict,
+    db_url: str,
+    errors,
+    stats: PipelineStats,
+    *,
+    chunk_size: int,
+    with_related: bool = False,
+    skip_errors: bool = False,
+    dedup_existing: bool = False,
+    metrics: StageMetrics | None = None,
+) -> LoadResult:
+    """ファイルを一時表へCOPYし、SQLで検査してから正常な行を本表へ移す
+
+    エラーは errors に行番号順で追記する。skip_errors=False でエラーがあれば何も投入しない。
+    dedup_existing: dedup_key が投入先テーブルの既存データと重複する行もエラーにする
+    """
+    import psycopg
+
+    metrics = metrics if metrics is not None else StageMetrics()
+    result = LoadResult()
+    raw_cols = {csv: f"c{i}" for i, csv in enumerate(_csv_columns(config))}
+
+    with psycopg.connect(db_url) as conn, conn.cursor() as raw_cur:
+        cur = CountingCursor(raw_cur)
+
+        with timed(stats.decode):
+            stats.rows_read = _copy_raw(cur, filepath, config, raw_cols, chunk_size)
+        stats.decode.rows_in = stats.decode.rows_out = stats.rows_read
+
+        with timed(stats.validate):
+            messages = _run_checks(cur, config, raw_cols, dedup_existing)
+            invalid_rows = _fetch_errors(conn, messages, errors)
+        stats.rows_valid = stats.rows_read - invalid_rows
+        stats.validate.rows_in, stats.validate.rows_out = stats.rows_read, stats.rows_valid
+
+        if invalid_rows and not skip_errors:
+            return result
+
+        with timed(metrics):
+            _promote(cur, config, raw_cols, with_related, result)
+            conn.commit()
+        metrics.rows_in += stats.rows_valid
+        metrics.rows_out += result.count
+        result.round_trips = cur.round_trips + 1
+
+    return result
+
+
+def _csv_columns(config: dict) -> list[str]:
+    """一時表に載せるCSV列（親テーブル・関連テーブルの定義順、重複なし）"""
+    col_defs = list(config["columns"])
+    for rel in config.get("related_tables", []):
+        col_defs.extend(rel["columns"])
+    return list(dict.fromkeys(c["csv"] for c in col_defs))
+
+
+def _copy_raw(cur, filepath, config: dict, raw_cols: dict[str, str], chunk_size: int) -> int:
+    """ファイルを読みながら (行番号, strip済みの値…) を一時表へCOPYする（空の値はNULL）"""
+    cur.execute(
+        f"CREATE TEMP TABLE {RAW_TABLE} (_row bigint, {', '.join(f'{c} text' for c in raw_cols.values())})"
+        " ON COMMIT DROP"
+    )
+    sql = f"COPY {RAW_TABLE} (_row, {', '.join(raw_cols.values())}) FROM STDIN"
+    count = 0
+
+    for row_num, rows, header in read_chunks(filepath, chunk_size):
+        if header is None:
+            rows, header = batch_rows(rows, config)
+        values_of = row_getter(header, list(raw_cols))
+        with cur.copy(sql) as copy:
+            for i, row in enumerate(rows):
+                copy.write_row((row_num + i, *(v.strip() or None for v in values_of(row))))
+        count += len(rows)
+
+    cur.execute(f"ANALYZE {RAW_TABLE}")
+    return count
+
+
+def _run_checks(cur, config: dict, raw_cols: dict[str, str], dedup_existing: bool) -> list:
+    """検査をSQLで実行し、失敗した (行番号, 検査番号, 値, 重複元の行番号) をエラー表に入れる
+
+    戻り値: 検査番号 → (CSV列名, 文言を作る関数 f(値, 重複元の行番号), 集計用の文言)
+    検査番号はエラーの並び（行内の順序）にも使う。validate_csv と同じくプランの列順・検査順で、
+    参照先・重複の検査はその後。重複は他のエラーがない行だけを対象にする（DedupIndex と同じ）。
+    """
+    cur.execute(
+        f"CREATE TEMP TABLE {ERROR_TABLE} (_row bigint, _check int, value text, first_row bigint) ON COMMIT DROP"
+    )
+    messages = []
+
+    def add(csv_col, message, summary=None):
+        # 集計用の文言は値・重複元の行番号を「…」にしたもの
+        messages.append((csv_col, message, summary or message(SUMMARY_VALUE, SUMMARY_VALUE)))
+        return len(messages) - 1
+
+    # 1. セル単位の検査は、一時表を1回だけ走査して全列まとめて判定する
+    cells = []
+    for col_def, rule in _checked_columns(config):
+        ref = f"r.{raw_cols[rule.csv]}"
+        if rule.required:
+            message = lambda v, f, csv_col=rule.csv: required_message(csv_col)
+            cells.append(f"({add(rule.csv, message)}, {ref} IS NULL, '')")
+        for check in rule.checks:
+            message = lambda v, f, check=check: check(v)
+            check_id = add(rule.csv, message, check_summary(check, rule.csv))
+            cells.append(f"({check_id}, {_check_condition(col_def, check, ref)}, {ref})")
+    if cells:
+        cur.execute(
+            f"INSERT INTO {ERROR_TABLE} (_row, _check, value)"
+            f" SELECT r._row, x.id, x.value FROM {RAW_TABLE} r"
+            f" CROSS JOIN LATERAL (VALUES {', '.join(cells)}) AS x(id, failed, value) WHERE x.failed"
+        )
+
+    # 2. 参照先の検査（lookup の参照先・外部キーの参照先に値があるか）
+    for table_name, col_defs, link in _tables(config):
+        foreign_keys = _foreign_keys(cur, table_name)
+        for col_def in col_defs:
+            ref = f"r.{raw_cols[col_def['csv']]}"
+            if col_def.get("type") == "lookup":
+                spec = col_def["lookup"]
+                message = lambda v, f, spec=spec: missing_message(spec["table"], spec["key"], v)
+                missing = f"NOT EXISTS (SELECT 1 FROM {spec['table']} l WHERE l.{spec['key']} = {ref})"
+                _insert_failures(cur, add(col_def["csv"], message), ref, f"{ref} IS NOT NULL AND {missing}")
+            if col_def["db"] in foreign_keys and col_def["db"] != link:
+                ref_table, ref_col = foreign_keys[col_def["db"]]
+                message = lambda v, f, c=col_def["csv"], t=ref_table: f"「{c}」の値が {t} に存在しません: {v}"
+                expr = f"({_value_expr(col_def, ref)})"
+                missing = f"NOT EXISTS (SELECT 1 FROM {ref_table} f WHERE f.{ref_col}::text = {expr}::text)"
+                _insert_failures(cur, add(col_def["csv"], message), ref, f"{expr} IS NOT NULL AND {missing}")
+
+    # 3. 重複の検査（dedup_key。既存データとの重複を先に判定し、その行はファイル内の初出にしない）
+    key_defs = dedup_columns(config)
+    if key_defs:
+        label = key_label(key_defs)
+        refs = [f"r.{raw_cols[c['csv']]}" for c in key_defs]
+        exprs = [f"({_value_expr(c, ref)})::text" for c, ref in zip(key_defs, refs)]
+        key_value = f"concat_ws(chr(31), {', '.join(exprs)})"
+        candidates = " AND ".join(
+            [f"{ref} IS NOT NULL" for ref in refs]
+            + [f"NOT EXISTS (SELECT 1 FROM {ERROR_TABLE} e WHERE e._row = r._row)"]
+        )
+
+        if dedup_existing:
+            same = " AND ".join(f"t.{c['db']}::text = {expr}" for c, expr in zip(key_defs, exprs))
+            check_id = add(key_defs[0]["csv"], lambda v, f: duplicate_message(label))
+            _insert_failures(
+                cur, check_id, key_value,
+                f"{candidates} AND EXISTS (SELECT 1 FROM {config['table']} t WHERE {same})",
+            )
+
+        check_id = add(key_defs[0]["csv"], lambda v, f: duplicate_message(label, f))
+        cur.execute(
+            f"INSERT INTO {ERROR_TABLE} (_row, _check, value, first_row)"
+            f" SELECT _row, {check_id}, key, first_row FROM ("
+            f"SELECT r._row, {key_value} AS key, min(r._row) OVER (PARTITION BY {', '.join(exprs)}) AS first_row"
+            f" FROM {RAW_TABLE} r WHERE {candidates}) d WHERE _row <> first_row"
+        )
+
+    return messages
+
+
+def _check_condition(col_def: dict, check, ref: str) -> str:
+    """validator の検査関数に対応する、失敗を表すSQLの条件（空の値はNULLなので対象外になる）"""
+    func = getattr(check, "func", check)
+    if func is _check_email:
+        return f"{ref} !~ {_sql_value(_EMAIL_PATTERN)}"
+    if func is _check_digits:
+        return f"{ref} !~ {_sql_value(_DIGITS_PATTERN % check.keywords['length'])}"
+    if func is _check_dropdown:
+        keys = [k for k in col_def.get("mapping", {}) if isinstance(k, str)]
+        if not keys:
+            return f"{ref} IS NOT NULL"
+        return f"{ref} NOT IN ({', '.join(map(_sql_value, keys))})"
+    raise ValueError(f"SQLに変換できない検査です: {check}")
+
+
+def _insert_failures(cur, check_id: int, value: str, condition: str) -> None:
+    cur.execute(
+        f"INSERT INTO {ERROR_TABLE} (_row, _check, value)"
+        f" SELECT r._row, {check_id}, {value} FROM {RAW_TABLE} r WHERE {condition}"
+    )
+
+
+def _fetch_errors(conn, messages: list, errors) -> int:
+    """エラー表を行番号順に読み、errors へ追記する。戻り値はエラーのある行数"""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(DISTINCT _row) FROM {ERROR_TABLE}")
+        invalid_rows = cur.fetchone()[0]
+
+    with conn.cursor(name="ansem_staging_errors") as cur:
+        cur.itersize = _FETCH_SIZE
+        cur.execute(f"SELECT _row, _check, value, first_row FROM {ERROR_TABLE} ORDER BY _row, _check")
+        while batch := cur.fetchmany(_FETCH_SIZE):
+            found = []
+            for row, check_id, value, first_row in batch:
+                csv_col, message, summary = messages[check_id]
+                found.append({
+                    "row": row,
+                    "column": csv_col,
+                    "value": value,
+                    "message": message(value, first_row),
+                    "check": summary,
+                })
+            errors.extend(found)
+
+    return invalid_rows
+
+
+def _promote(cur, config: dict, raw_cols: dict[str, str], with_related: bool, result: LoadResult) -> None:
+    """エラーのない行を、変換しながら1文で本表（と関連テーブル）へ移す
+
+    空の値（NULL）の列はDBのDEFAULT式で置き換える（列を省略した場合と同じ結果になる）。
+    関連テーブルがある場合は、親の主キーを順序から行番号順に採番して外部キーに使う。
+    """
+    table_name = config["table"]
+    valid = (
+        f"SELECT r.* FROM {RAW_TABLE} r"
+        f" WHERE NOT EXISTS (SELECT 1 FROM {ERROR_TABLE} e WHERE e._row = r._row) ORDER BY r._row"
+    )
+    related = config.get("related_tables", []) if with_related else []
+
+    parent = {c["db"]: _value_expr(c, f"v.{raw_cols[c['csv']]}") for c in config["columns"]}
+    parent_cols = _target_columns(cur, table_name)
+    if related:
+        primary_key = config["primary_key"]
+        sequence = primary_key_sequence(cur, table_name, primary_key, "--load-mode staging")
+        ctes = [f"v AS (SELECT v.*, nextval({_sql_value(sequence)}::regclass) AS _id FROM ({valid}) v)"]
+        cols = [primary_key, *parent]
+        values = ["v._id", *(_target_value(parent_cols, c, e) for c, e in parent.items())]
+        overriding = " OVERRIDING SYSTEM VALUE"
+    else:
+        ctes = [f"v AS ({valid})"]
+        cols = list(parent)
+        values = [_target_value(parent_cols, c, e) for c, e in parent.items()]
+        overriding = ""
+    ctes.append(
+        f"p AS (INSERT INTO {table_name} ({', '.join(cols)}){overriding}"
+        f" SELECT {', '.join(values)} FROM v ORDER BY v._row RETURNING 1)"
+    )
+
+    for n, rel in enumerate(related):
+        rel_cols = _target_columns(cur, rel["table"])
+        records = _related_records(rel, raw_cols)
+        cols = list(dict.fromkeys(c for record, _ in records for c in record))
+        branches = []
+        for order, (record, condition) in enumerate(records):
+            values = [_target_value(rel_cols, c, record.get(c, "NULL")) for c in cols]
+            branches.append(
+                f"SELECT v._id, v._row, {order} AS _order, {', '.join(values)} FROM v WHERE {condition}"
+            )
+        ctes.append(
+            f"r{n} AS (INSERT INTO {rel['table']} ({rel['foreign_key']}, {', '.join(cols)})"
+            f" SELECT x._id, {', '.join(f'x.{c}' for c in cols)}"
+            f" FROM ({' UNION ALL '.join(branches)}) AS x(_id, _row, _order, {', '.join(cols)})"
+            f" ORDER BY x._row, x._order RETURNING 1)"
+        )
+
+    counts = ["(SELECT count(*) FROM p)"] + [f"(SELECT count(*) FROM r{n})" for n in range(len(related))]
+    cur.execute(f"WITH {', '.join(ctes)} SELECT {', '.join(counts)}")
+    parent_count, *related_counts = cur.fetchone()
+
+    result.count = parent_count
+    for rel, count in zip(related, related_counts):
+        if count:
+            result.related[rel["table"]] = count
+
+
+def _related_records(rel: dict, raw_cols: dict[str, str]) -> list[tuple[dict[str, str], str]]:
+    """関連テーブルの1行から作るレコード（DB列 → 式, 作る条件）の一覧（transform_related と同じ分け方）
+
+    extra付きの列は値があれば1列につき1レコード、それ以外の列は1つでも値があれば1レコードにまとめる。
+    """
+    records = []
+    merged = {}
+    for col_def in rel["columns"]:
+        ref = f"v.{raw_cols[col_def['csv']]}"
+        if "extra" in col_def:
+            record = {col_def["db"]: _value_expr(col_def, ref)}
+            record.update({k: _sql_value(v) for k, v in col_def["extra"].items()})
+            records.append((record, f"{ref} IS NOT NULL"))
+        else:
+            merged[col_def["db"]] = (_value_expr(col_def, ref), ref)
+    if merged:
+        condition = " OR ".join(f"{ref} IS NOT NULL" for _, ref in merged.values())
+        records.append(({db: expr for db, (expr, _) in merged.items()}, condition))
+    return records
+
+
+def _value_expr(col_def: dict, ref: str) -> str:
+    """1セルの変換（transformer._convert_value と同じ）をSQLの式にする（空の値はNULLのまま）"""
+    col_type = col_def.get("type")
+    if col_type in ("dropdown", "boolean"):
+        cases = " ".join(
+            f"WHEN {ref} = {_sql_value(k)} THEN {_sql_value(v)}"
+            for k, v in col_def["mapping"].items()
+            if isinstance(k, str)
+        )
+        # 対応表にない値はドロップダウンならエラー行（NULLにしておく）、booleanならFALSE
+        otherwise = "NULL" if col_type == "dropdown" else "FALSE"
+        return f"CASE WHEN {ref} IS NULL THEN NULL {cases} ELSE {otherwise} END"
+    if col_type == "lookup":
+        spec = col_def["lookup"]
+        return f"(SELECT l.{spec['value']} FROM {spec['table']} l WHERE l.{spec['key']} = {ref})"
+    return ref
+
+
+def _target_columns(cur, table_name: str) -> dict[str, tuple[str, str | None]]:
+    """列名 → (型, DEFAULT式)"""
+    cur.execute(
+        "SELECT a.attname, format_type(a.atttypid, a.atttypmod), pg_get_expr(d.adbin, d.adrelid)"
+        " FROM pg_attribute a LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum"
+        " WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped",
+        (table_name,),
+    )
+    return {name: (col_type, default) for name, col_type, default in cur.fetchall()}
+
+
+def _target_value(columns: dict, col: str, expr: str) -> str:
+    """列の型にそろえ、NULLならDEFAULT式に置き換えた式"""
+    col_type, default = columns[col]
+    if default is not None:
+        expr = f"COALESCE({expr}, {default})"
+    return f"CAST({expr} AS {col_type})"
+
+
+def _foreign_keys(cur, table_name: str) -> dict[str, tuple[str, str]]:
+    """1列の外部キー制約: 列名 → (参照先テーブル, 参照先の列)"""
+    cur.execute(
+        "SELECT a.attname, c.confrelid::regclass::text, fa.attname FROM pg_constraint c"
+        " JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]"
+        " JOIN pg_attribute fa ON fa.attrelid = c.confrelid AND fa.attnum = c.confkey[1]"
+        " WHERE c.conrelid = %s::regclass AND c.contype = 'f' AND cardinality(c.conkey) = 1",
+        (table_name,),
+    )
+    return {col: (ref_table, ref_col) for col, ref_table, ref_col in cur.fetchall()}
+
+
+def _tables(config: dict):
+    """(テーブル名, 列定義, 親とつなぐ外部キー列) を親・関連テーブルの順に返す"""
+    yield config["table"], config["columns"], None
+    for rel in config.get("related_tables", []):
+        yield rel["table"], rel["columns"], rel["foreign_key"]
@@ -0,0 +1,131 @@
+"""テーブル定義YAMLの読み込みとコンパイル済みキャッシュ
+
+YAMLの解析・構造チェック・バリデーションプランのコンパイルは定義ごとに1回で済むため、
+結果を `tables/__pycache__/<テーブル名>.tabledef.pickle` に保存して次回の起動で使い回す。
+キャッシュはYAMLの更新時刻・サイズで照合し、一致しなければ内容のSHA-256で照合する
+（git checkout 等で時刻だけ変わった場合は再コンパイルしない）。
+"""
+
+import hashlib
+import os
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+
+from .validator import ColumnRule, compile_plan
+
+CACHE_DIRNAME = "__pycache__"
+CACHE_SUFFIX = ".tabledef.pickle"
+# コンパイル結果の形式が変わったら上げる（古いキャッシュは読み捨てる）
+CACHE_VERSION = 2
+
+
+class TableDefinitionError(Exception):
+    """テーブル定義YAMLの構造が不正"""
+
+
+@dataclass
+class TableDef:
+    """コンパイル済みのテーブル定義"""
+
+    config: dict
+    plan: tuple[ColumnRule, ...]
+
+
+def load_table_def(path, use_cache: bool = True) -> TableDef:
+    """テーブル定義を読み込む（キャッシュが有効ならYAMLを解析しない）"""
+    path = Path(path)
+    stat = path.stat()
+    cache_path = path.parent / CACHE_DIRNAME / (path.stem + CACHE_SUFFIX)
+
+    content_hash = None
+    if use_cache:
+        cached = _read_cache(cache_path)
+        if cached is not None:
+            if (cached["mtime_ns"], cached["size"]) == (stat.st_mtime_ns, stat.st_size):
+                return cached["table_def"]
+            content_hash = _sha256(path)
+            if cached["sha256"] == content_hash:
+                _write_cache(cache_path, cached["table_def"], stat, content_hash)
+                return cached["table_def"]
+
+    table_def = compile_table_def(path)
+    if use_cache:
+        _write_cache(cache_path, table_def, stat, content_hash or _sha256(path))
+    return table_def
+
+
+def compile_table_def(path) -> TableDef:
+    """YAMLを解析し、構造をチェックしてプランをコンパイルする"""
+    import yaml
+
+    with open(path, encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    check_config(config, str(path))
+    return TableDef(config=config, plan=compile_plan(config))
+
+
+def check_config(config, source: str = "テーブル定義") -> None:
+    """投入処理が前提とするキーがそろっているか確認する"""
+    if not isinstance(config, dict):
+        raise TableDefinitionError(f"{source}: トップレベルがマッピングではありません")
+    for key in ("table", "display_name", "columns"):
+        if key not in config:
+            raise TableDefinitionError(f"{source}: {key} がありません")
+
+    tables = [(config["table"], config["columns"])]
+    for rel in config.get("related_tables", []):
+        if "table" not in rel or "columns" not in rel:
+            raise TableDefinitionError(f"{source}: related_tables には table と columns が必要です")
+        if "foreign_key" not in rel:
+            raise TableDefinitionError(f"{source}: {rel['table']} に foreign_key がありません")
+        tables.append((rel["table"], rel["columns"]))
+    if config.get("related_tables") and "primary_key" not in config:
+        raise TableDefinitionError(f"{source}: related_tables を使うには primary_key が必要です")
+
+    for table_name, col_defs in tables:
+        for col_def in col_defs:
+            if "csv" not in col_def or "db" not in col_def:
+                raise TableDefinitionError(f"{source}: {table_name} の列に csv / db がありません: {col_def}")
+            col_type = col_def.get("type")
+            if col_type in ("dropdown", "boolean") and not isinstance(col_def.get("mapping"), dict):
+                raise TableDefinitionError(f"{source}: {col_def['csv']} に mapping がありません")
+            if col_type == "lookup" and set(col_def.get("lookup") or {}) != {"table", "key", "value"}:
+                raise TableDefinitionError(
+                    f"{source}: {col_def['csv']} の lookup には table / key / value が必要です"
+                )
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _read_cache(cache_path: Path) -> dict | None:
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None  # 壊れたキャッシュや旧バージョンのクラスは作り直す
+    if not isinstance(cached, dict) or cached.get("version") != CACHE_VERSION:
+        return None
+    return cached
+
+
+def _write_cache(cache_path: Path, table_def: TableDef, stat: os.stat_result, content_hash: str) -> None:
+    """キャッシュを書く（書けない環境では何もしない）"""
+    data = {
+        "version": CACHE_VERSION,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": content_hash,
+        "table_def": table_def,
+    }
+    try:
+        cache_path.parent.mkdir(exist_ok=True)
+        tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(cache_path)
+    except OSError:
+        pass
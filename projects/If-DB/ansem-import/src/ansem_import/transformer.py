@@ -1,55 +1,76 @@
 """ID変換・正規化"""
 
+from typing import Iterable
 
-def transform_rows(rows: list[dict], config: dict) -> list[dict]:
-    """CSV値をDB投入用に変換する"""
+from .reader import row_getter
+
+
+def transform_rows(rows: Iterable, config: dict, header: dict[str, int] | None = None) -> list[dict]:
+    """CSV値をDB投入用に変換する
+
+    header: rowsがタプルの場合のヘッダー索引（省略時はrowsを辞書として扱う）
+    """
+    col_defs = config["columns"]
+    values_of = row_getter(header, [c["csv"] for c in col_defs])
     transformed = []
 
     for row in rows:
         record = {}
-        for col_def in config["columns"]:
-            csv_col = col_def["csv"]
-            db_col = col_def["db"]
-            value = row.get(csv_col, "").strip()
-
-            if not value:
-                record[db_col] = None
-                continue
-
-            col_type = col_def.get("type")
-            if col_type == "dropdown":
-                record[db_col] = col_def["mapping"].get(value, value)
-            elif col_type == "boolean":
-                record[db_col] = col_def["mapping"].get(value, False)
-            else:
-                record[db_col] = value
+        for col_def, value in zip(col_defs, values_of(row)):
+            value = value.strip()
+            record[col_def["db"]] = _convert_value(value, col_def) if value else None
 
         transformed.append(record)
 
     return transformed
 
 
-def transform_related(rows: list[dict], config: dict) -> dict[str, list[dict]]:
-    """関連テーブル（SNS、口座等）のデータを分離・変換する"""
+def transform_related(
+    rows: list, config: dict, header: dict[str, int] | None = None
+) -> dict[str, list[tuple[int, dict]]]:
+    """関連テーブル（SNS、口座等）のデータを分離・変換する
+
+    戻り値: テーブル名 → [(rows内の親行インデックス, レコード), ...]
+    extra付きの列は1列につき1レコード（SNSアカウント等）、
+    それ以外の列は1行につき1レコードにまとめる（口座・住所等）。
+    """
     related_data = {}
 
     for rel in config.get("related_tables", []):
         table_name = rel["table"]
+        col_defs = rel["columns"]
+        values_of = row_getter(header, [c["csv"] for c in col_defs])
         records = []
 
-        for row in rows:
-            for col_def in rel["columns"]:
-                csv_col = col_def["csv"]
-                value = row.get(csv_col, "").strip()
+        for i, row in enumerate(rows):
+            merged = {}
+            for col_def, value in zip(col_defs, values_of(row)):
+                value = value.strip()
                 if not value:
                     continue
 
-                record = {col_def["db"]: value}
                 if "extra" in col_def:
+                    record = {col_def["db"]: _convert_value(value, col_def)}
                     record.update(col_def["extra"])
-                records.append(record)
+                    records.append((i, record))
+                else:
+                    merged[col_def["db"]] = _convert_value(value, col_def)
+
+            if merged:
+                records.append((i, merged))
 
         if records:
             related_data[table_name] = records
 
     return related_data
+
+
+def _convert_value(value: str, col_def: dict):
+    """列定義に従って1セルを変換（空値は呼び出し側で処理）"""
+    col_type = col_def.get("type")
+    if col_type == "dropdown":
+        return col_def["mapping"].get(value, value)
+    if col_type == "boolean":
+        return col_def["mapping"].get(value, False)
+    # lookup は名前のまま返し、投入直前に lookup.LookupResolver がIDへまとめて置き換える
+    return value
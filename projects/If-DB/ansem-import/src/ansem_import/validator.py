@@ -1,79 +1,218 @@
 """バリデーションエンジン"""
 
+import operator
 import re
+from dataclasses import dataclass
+from functools import partial
+from itertools import compress
+from typing import Callable, Sequence
 
+from .reader import row_getter
 
-def validate_csv(rows: list[dict], config: dict) -> tuple[list[dict], list[dict]]:
-    """CSV行をバリデーションし、正常行とエラーを分離する"""
-    valid = []
-    errors = []
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+_INVERT = bytes.maketrans(b"\x00\x01", b"\x01\x00")
 
-    for i, row in enumerate(rows, start=2):  # ヘッダーが1行目なので2行目から
-        row_errors = _validate_row(row, config, i)
-        if row_errors:
-            errors.extend(row_errors)
-        else:
-            valid.append(row)
+# エラー集計の文言で値の代わりに入れる文字（ErrorCollector は列と値を除いた文言で集計する）
+SUMMARY_VALUE = "…"
 
-    return valid, errors
 
+@dataclass(frozen=True)
+class ColumnRule:
+    """1列分のバリデーションルール（compile_planで生成）
 
-def _validate_row(row: dict, config: dict, row_num: int) -> list[dict]:
-    """1行のバリデーション"""
-    errors = []
+    checks: 値を受け取り、エラーメッセージ（正常ならNone）を返す関数
+    masks: checksと同じ順の列単位版。値の列を受け取り、エラーの行を1にしたマスクを返す
+    """
+
+    csv: str
+    required: bool
+    checks: tuple[Callable[[str], str | None], ...]
+    masks: tuple[Callable[[Sequence[str]], bytes], ...] = ()
 
-    for col_def in config["columns"]:
-        csv_col = col_def["csv"]
-        value = row.get(csv_col, "").strip()
 
-        # 必須チェック
-        if col_def.get("required") and not value:
-            errors.append({
-                "row": row_num,
-                "column": csv_col,
-                "value": "",
-                "message": f"必須項目「{csv_col}」が空です",
-            })
-            continue
+def compile_plan(config: dict) -> tuple[ColumnRule, ...]:
+    """テーブル定義をバリデーションプランにコンパイルする
 
-        if not value:
-            continue
+    formatの解析・正規表現のコンパイル・ドロップダウン有効値の集合化を
+    テーブル定義ごとに1回だけ行い、行ごとの処理ではプランを使い回す。
+    related_tablesの列も同じ行から投入されるため、あわせて検査対象にする。
+    """
+    plan = []
+    col_defs = list(config["columns"])
+    for rel in config.get("related_tables", []):
+        col_defs.extend(rel["columns"])
+
+    for col_def in col_defs:
+        csv_col = col_def["csv"]
+        checks = []
+        masks = []
 
         # 形式チェック
         fmt = col_def.get("format")
-        if fmt == "email" and not _is_valid_email(value):
-            errors.append({
-                "row": row_num,
-                "column": csv_col,
-                "value": value,
-                "message": f"メールアドレス形式不正: {value}",
-            })
-
-        if fmt and fmt.startswith("digits:"):
+        if fmt == "email":
+            checks.append(_check_email)
+            masks.append(_email_mask)
+        elif fmt and fmt.startswith("digits:"):
             length = int(fmt.split(":")[1])
-            if not re.fullmatch(r"\d{" + str(length) + "}", value):
-                errors.append({
-                    "row": row_num,
-                    "column": csv_col,
-                    "value": value,
-                    "message": f"{csv_col}は{length}桁の数字が必要: {value}",
-                })
+            pattern = re.compile(r"\d{" + str(length) + "}")
+            checks.append(partial(_check_digits, pattern=pattern, length=length, csv_col=csv_col))
+            masks.append(partial(_digits_mask, length=length))
 
         # ドロップダウンチェック
         if col_def.get("type") == "dropdown":
             mapping = col_def.get("mapping", {})
-            if value not in mapping:
-                allowed = ", ".join(mapping.keys())
-                errors.append({
-                    "row": row_num,
-                    "column": csv_col,
-                    "value": value,
-                    "message": f"「{csv_col}」の値が不正: {value}（有効値: {allowed}）",
-                })
+            allowed = frozenset(mapping)
+            checks.append(partial(
+                _check_dropdown,
+                allowed=allowed,
+                allowed_text=", ".join(mapping.keys()),
+                csv_col=csv_col,
+            ))
+            masks.append(partial(_dropdown_mask, allowed=allowed))
+
+        required = bool(col_def.get("required"))
+        if not required and not checks:
+            continue  # 検査対象がない列はプランから外す
+
+        plan.append(ColumnRule(csv=csv_col, required=required, checks=tuple(checks), masks=tuple(masks)))
+
+    return tuple(plan)
+
+
+def validate_csv(
+    rows: list,
+    config: dict,
+    start_row: int = 2,
+    *,
+    plan: tuple[ColumnRule, ...] | None = None,
+    header: dict[str, int] | None = None,
+) -> tuple[list, list[dict]]:
+    """CSV行をバリデーションし、正常行とエラーを分離する
+
+    start_row: rowsの先頭行のCSV行番号（チャンク処理時に指定）
+    plan: compile_plan済みのプラン（省略時はconfigからコンパイル）
+    header: rowsがタプルの場合のヘッダー索引（省略時はrowsを辞書として扱う）
+    """
+    if plan is None:
+        plan = compile_plan(config)
+    if not rows:
+        return [], []
+
+    # 行を列に組み替え、列ごとにまとめて検査する（ループはmap・zip等のC実装に任せる）
+    columns = zip(*map(row_getter(header, [rule.csv for rule in plan]), rows)) if plan else ()
+    invalid = 0
+    found = []  # (行の位置, エラー)。列順に集めて最後に行順へ並べ替える
+
+    for rule, column in zip(plan, columns):
+        values = list(map(str.strip, column))
+        for mask, check in _failures(rule, values):
+            invalid |= int.from_bytes(mask, "little")
+            summary = check_summary(check, rule.csv)
+            for i in compress(range(len(values)), mask):
+                found.append((i, {
+                    "row": start_row + i,
+                    "column": rule.csv,
+                    "value": "" if check is None else values[i],
+                    "message": required_message(rule.csv) if check is None else check(values[i]),
+                    "check": summary,
+                }))
+
+    # 安定ソートなので、同じ行の中ではプランの列順・検査順が保たれる
+    found.sort(key=operator.itemgetter(0))
+    errors = [error for _, error in found]
+    valid = list(compress(rows, invalid.to_bytes(len(rows), "little").translate(_INVERT)))
+    return valid, errors
+
+
+def column_failures(rule: ColumnRule, values: Sequence[str]) -> bytes:
+    """1列分の値（strip済み）をまとめて検査し、エラーのある行を1にしたマスクを返す"""
+    invalid = 0
+    for mask, _ in _failures(rule, values):
+        invalid |= int.from_bytes(mask, "little")
+    return invalid.to_bytes(len(values), "little")
+
+
+def _failures(rule: ColumnRule, values: Sequence[str]):
+    """（マスク, メッセージ用の検査関数）を流す。必須チェックの検査関数はNone
+
+    空の値は必須チェックだけの対象で、形式・ドロップダウンは検査しない（行単位版と同じ）。
+    """
+    empty = bytes(map(operator.not_, values))
+    if rule.required and any(empty):
+        yield empty, None
+    if not rule.masks:
+        return
+
+    filled = int.from_bytes(empty.translate(_INVERT), "little")
+    for mask_fn, check in zip(rule.masks, rule.checks):
+        failed = int.from_bytes(mask_fn(values), "little") & filled
+        if failed:
+            yield failed.to_bytes(len(values), "little"), check
+
+
+def _email_mask(values: Sequence[str]) -> bytes:
+    return bytes(map(operator.not_, map(_EMAIL_RE.fullmatch, values)))
+
+
+def _digits_mask(values: Sequence[str], length: int) -> bytes:
+    # \d はUnicodeの10進数字（Nd）に一致するため、同じ範囲の str.isdecimal で判定する
+    ok = map(operator.and_, map(str.isdecimal, values), map(length.__eq__, map(len, values)))
+    return bytes(map(operator.not_, ok))
+
+
+def _dropdown_mask(values: Sequence[str], allowed: frozenset) -> bytes:
+    return bytes(map(operator.not_, map(allowed.__contains__, values)))
+
+
+def required_message(csv_col: str) -> str:
+    return f"必須項目「{csv_col}」が空です"
+
+
+def check_summary(check: Callable[[str], str | None] | None, csv_col: str) -> str:
+    """検査の文言から値を除いたもの（エラー集計のキー）。check=None は必須チェック"""
+    if check is None:
+        return required_message(csv_col)
+    func = getattr(check, "func", check)
+    return _MESSAGES[func](SUMMARY_VALUE, **getattr(check, "keywords", {}))
+
+
+def _check_email(value: str) -> str | None:
+    if not _is_valid_email(value):
+        return _email_message(value)
+    return None
+
+
+def _check_digits(value: str, pattern: re.Pattern, length: int, csv_col: str) -> str | None:
+    if not pattern.fullmatch(value):
+        return _digits_message(value, length=length, csv_col=csv_col)
+    return None
+
+
+def _check_dropdown(value: str, allowed: frozenset, allowed_text: str, csv_col: str) -> str | None:
+    if value not in allowed:
+        return _dropdown_message(value, allowed_text=allowed_text, csv_col=csv_col)
+    return None
+
+
+def _email_message(value: str) -> str:
+    return f"メールアドレス形式不正: {value}"
+
+
+def _digits_message(value: str, *, length: int, csv_col: str, **_) -> str:
+    return f"{csv_col}は{length}桁の数字が必要: {value}"
+
+
+def _dropdown_message(value: str, *, allowed_text: str, csv_col: str, **_) -> str:
+    return f"「{csv_col}」の値が不正: {value}（有効値: {allowed_text}）"
+
 
-    return errors
+_MESSAGES = {
+    _check_email: _email_message,
+    _check_digits: _digits_message,
+    _check_dropdown: _dropdown_message,
+}
 
 
 def _is_valid_email(email: str) -> bool:
     """簡易メールアドレスバリデーション"""
-    return bool(re.fullmatch(r"[^@\s]+@[^@\s]+\.[^@\s]+", email))
+    return bool(_EMAIL_RE.fullmatch(email))
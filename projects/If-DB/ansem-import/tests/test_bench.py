@@ -0,0 +1,42 @@
+"""bench のスモークテスト（DBなし・スタブカーソルで全ての投入方式を通す）"""
+
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from ansem_import.bench import generate_csv, run_benchmark
+from ansem_import.cli import main
+from ansem_import.tabledef import compile_table_def
+
+TABLES_DIR = Path(__file__).resolve().parent.parent / "tables"
+LOAD_MODES = ["insert", "copy", "prepared"]
+
+
+@pytest.fixture(scope="module")
+def config():
+    return compile_table_def(TABLES_DIR / "influencers.yaml").config
+
+
+@pytest.mark.parametrize("load_mode", LOAD_MODES)
+def test_run_benchmark_stub(config, tmp_path, load_mode):
+    csv_path = tmp_path / "bench.csv"
+    generate_csv(config, csv_path, 250, seed=1)
+
+    results = run_benchmark(config, csv_path, load_mode=load_mode, chunk_size=100)
+
+    assert [r.stage for r in results] == [
+        "read", "validate_csv", "transform_rows", "generate_sql", f"load [{load_mode}, stub]",
+    ]
+    assert results[0].rows == 250
+    assert results[-1].rows == results[2].rows == 250
+
+
+@pytest.mark.parametrize("load_mode", LOAD_MODES)
+def test_bench_command(load_mode):
+    result = CliRunner().invoke(
+        main, ["bench", "-t", "influencers", "-n", "120", "--seed", "1", "--load-mode", load_mode]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert f"load [{load_mode}, stub]" in result.output
@@ -0,0 +1,49 @@
+"""checkpoint のテスト（--commit-every / --resume の再開位置）"""
+
+import json
+
+import pytest
+
+from ansem_import.checkpoint import (
+    CheckpointMismatch, checkpoint_path, clear_checkpoint, file_hash, load_checkpoint, save_checkpoint,
+)
+from ansem_import.reader import read_rows
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("名前\n" + "".join(f"n{i}\n" for i in range(10)), encoding="utf-8")
+    return path
+
+
+def test_round_trip(csv_path):
+    content_hash = file_hash(csv_path)
+    assert load_checkpoint(csv_path, "t", content_hash) == 0
+
+    save_checkpoint(csv_path, "t", content_hash, 4)
+
+    assert checkpoint_path(csv_path).name == "data.csv.checkpoint.json"
+    data = json.loads(checkpoint_path(csv_path).read_text(encoding="utf-8"))
+    assert (data["rows_done"], data["last_row"], data["table"]) == (4, 5, "t")
+    assert load_checkpoint(csv_path, "t", content_hash) == 4
+
+    # 再開時は投入済みの行を読み飛ばし、行番号は元のCSVのまま
+    [(row_num, rows, _)] = read_rows(csv_path, 100, skip_rows=4)
+    assert row_num == 6
+    assert rows[0] == ("n4",)
+
+    clear_checkpoint(csv_path)
+    clear_checkpoint(csv_path)
+    assert load_checkpoint(csv_path, "t", content_hash) == 0
+
+
+def test_mismatch(csv_path):
+    save_checkpoint(csv_path, "t", file_hash(csv_path), 4)
+
+    with pytest.raises(CheckpointMismatch):
+        load_checkpoint(csv_path, "other", file_hash(csv_path))
+
+    csv_path.write_text("名前\nchanged\n", encoding="utf-8")
+    with pytest.raises(CheckpointMismatch):
+        load_checkpoint(csv_path, "t", file_hash(csv_path))
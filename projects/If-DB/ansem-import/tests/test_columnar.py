@@ -0,0 +1,57 @@
+"""columnar の列単位バリデーションがCSV入力（validate_csv）と同じ結果になること"""
+
+from pathlib import Path
+
+import pytest
+
+from ansem_import.tabledef import compile_table_def
+from ansem_import.validator import validate_csv
+
+pa = pytest.importorskip("pyarrow")
+
+from ansem_import.columnar import batch_rows, validate_batch  # noqa: E402
+
+TABLES_DIR = Path(__file__).resolve().parent.parent / "tables"
+
+# str.isspace() が真になる文字（Pythonの \s に一致する文字）
+SPACES = [chr(c) for c in range(0x110000) if chr(c).isspace()]
+
+
+@pytest.fixture(scope="module")
+def config():
+    return compile_table_def(TABLES_DIR / "influencers.yaml").config
+
+
+def _rows(config, emails: list[str]) -> tuple[list[str], list[tuple[str, ...]]]:
+    names = list(dict.fromkeys(
+        [c["csv"] for c in config["columns"]]
+        + [c["csv"] for rel in config.get("related_tables", []) for c in rel["columns"]]
+    ))
+    base = {name: "" for name in names}
+    base.update({"マスター名": "山田", "区分": "1"})
+    rows = [tuple({**base, "メールアドレス": email}.get(n) for n in names) for email in emails]
+    return names, rows
+
+
+def _compare(config, emails):
+    names, rows = _rows(config, emails)
+    header = {name: i for i, name in enumerate(names)}
+    batch = pa.RecordBatch.from_arrays([pa.array(col) for col in zip(*rows)], names=names)
+
+    csv_valid, csv_errors = validate_csv(rows, config, header=header)
+    valid_batch, batch_errors = validate_batch(batch, config, 2)
+
+    assert batch_errors == csv_errors
+    valid_rows, valid_header = batch_rows(valid_batch, config)
+    assert [tuple(row[valid_header[n]] for n in names) for row in valid_rows] == csv_valid
+
+
+def test_email_whitespace_matches_csv(config):
+    emails = ["taro@example.com"]
+    for space in SPACES:
+        emails += [f"ta{space}ro@example.com", f"taro@exa{space}mple.com", f"taro@example.c{space}om"]
+    _compare(config, emails)
+
+
+def test_email_and_required_matches_csv(config):
+    _compare(config, ["", "  ", "a@b.c", "a@b", "@b.c", "a@@b.c", "ａ@例え.日本", " a@b.c "])
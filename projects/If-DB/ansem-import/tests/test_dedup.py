@@ -0,0 +1,65 @@
+"""dedup のテスト（ファイル内・既存データとの重複、親レコードの除去）"""
+
+from ansem_import.dedup import DedupIndex, dedup_columns, drop_rows, key_hash, row_keys
+
+CONFIG = {
+    "table": "t",
+    "natural_key": ["code"],
+    "dedup_key": ["name", "kind"],
+    "columns": [
+        {"csv": "名前", "db": "name"},
+        {"csv": "区分", "db": "kind", "type": "dropdown", "mapping": {"甲": 1, "乙": 2}},
+        {"csv": "コード", "db": "code"},
+    ],
+}
+HEADER = {"名前": 0, "区分": 1, "コード": 2}
+
+
+def test_dedup_columns_prefers_dedup_key():
+    assert [c["db"] for c in dedup_columns(CONFIG)] == ["name", "kind"]
+    assert [c["db"] for c in dedup_columns({**CONFIG, "dedup_key": None})] == ["code"]
+    assert dedup_columns({"columns": CONFIG["columns"]}) == []
+
+
+def test_row_keys_use_converted_values():
+    rows = [(" 山田 ", "甲", "1"), ("山田", "", "2"), ("佐藤", "乙", "3")]
+
+    assert row_keys(rows, HEADER, dedup_columns(CONFIG)) == [("山田", "1"), None, ("佐藤", "2")]
+
+
+def test_check_within_file_and_across_chunks():
+    index = DedupIndex(dedup_columns(CONFIG))
+
+    assert index.check([("山田", "1"), None, ("山田", "1")], [2, 3, 4])[0] == [2]
+    duplicates, errors = index.check([("佐藤", "2"), ("山田", "1")], [5, 6])
+
+    assert duplicates == [1]
+    assert errors == [{
+        "row": 6,
+        "column": "名前",
+        "value": "山田\x1f1",
+        "message": "「名前」・「区分」が行2と重複しています",
+        "check": "「名前」・「区分」が行…と重複しています",
+    }]
+
+
+def test_check_existing_keys():
+    index = DedupIndex(dedup_columns(CONFIG), existing={key_hash(("山田", "1"))})
+
+    duplicates, errors = index.check([("山田", "1"), ("山田", "1"), ("佐藤", "2")], [2, 3, 4])
+
+    assert duplicates == [0, 1]
+    assert {e["message"] for e in errors} == {"「名前」・「区分」が登録済みのデータと重複しています"}
+
+
+def test_drop_rows_reindexes_related():
+    records = [{"name": "a"}, {"name": "b"}, {"name": "c"}, {"name": "d"}]
+    related = {
+        "sns": [(0, {"url": "a"}), (1, {"url": "b"}), (3, {"url": "d1"}), (3, {"url": "d2"})],
+        "bank": [(1, {"number": "b"})],
+    }
+
+    kept, kept_related = drop_rows(records, related, [1, 2])
+
+    assert kept == [{"name": "a"}, {"name": "d"}]
+    assert kept_related == {"sns": [(0, {"url": "a"}), (1, {"url": "d1"}), (1, {"url": "d2"})]}
@@ -0,0 +1,59 @@
+"""ErrorCollector の集計のテスト"""
+
+import pytest
+
+from ansem_import.errors import ErrorCollector, TooManyErrors
+from ansem_import.validator import validate_csv
+
+CONFIG = {
+    "table": "t",
+    "columns": [
+        {"csv": "名前", "db": "name", "required": True},
+        {"csv": "メール", "db": "email", "format": "email"},
+    ],
+}
+HEADER = {"名前": 0, "メール": 1}
+
+
+def test_first_message_keeps_value():
+    rows = [("a", "x@y.z"), ("b", "bad-1"), ("c", "bad-2")]
+    _, found = validate_csv(rows, CONFIG, header=HEADER)
+
+    errors = ErrorCollector(samples=1)
+    errors.extend(found)
+
+    [group] = errors.summary()
+    assert group.message == "メールアドレス形式不正: …"
+    assert group.first_message == "メールアドレス形式不正: bad-1"
+    assert group.rows == [3]
+    assert group.count == 2
+
+
+def test_groups_by_check_not_value(tmp_path):
+    # 値が文言の他の部分と同じでも、値を除いた check で集計する
+    found = [
+        {"row": 2, "column": "メール", "value": "…", "message": "メールアドレス形式不正: …", "check": "メールアドレス形式不正: …"},
+        {"row": 3, "column": "メール", "value": "x", "message": "メールアドレス形式不正: x", "check": "メールアドレス形式不正: …"},
+        {"row": 4, "column": "名前", "value": "", "message": "必須項目「名前」が空です", "check": "必須項目「名前」が空です"},
+        {"row": 5, "column": "メール", "value": "y", "message": "メールアドレス形式不正: y", "check": "メールアドレス形式不正: …"},
+    ]
+    report = tmp_path / "report.csv"
+
+    with ErrorCollector(report, samples=2) as errors:
+        errors.extend(found[:2])
+        errors.extend(found[2:])
+
+    assert len(errors) == 4
+    assert [(g.column, g.count, g.rows) for g in errors.summary()] == [("メール", 3, [2, 3]), ("名前", 1, [4])]
+    lines = report.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "row,column,value,message"
+    assert lines[2] == "3,メール,x,メールアドレス形式不正: x"
+    assert len(lines) == 5
+
+
+def test_max_errors():
+    errors = ErrorCollector(max_errors=2)
+    errors.extend([{"row": 2, "column": "a", "message": "m", "check": "m"}] * 2)
+
+    with pytest.raises(TooManyErrors):
+        errors.extend([{"row": 3, "column": "a", "message": "m", "check": "m"}])
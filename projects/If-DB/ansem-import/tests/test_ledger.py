@@ -0,0 +1,59 @@
+"""ledger のテスト（投入済みファイルの判定）"""
+
+import os
+
+import pytest
+
+from ansem_import.ledger import ImportLedger, LedgerEntry, table_def_hash
+
+DB_URL = "postgresql://localhost/test"
+CONFIG = {"table": "t", "columns": [{"csv": "名前", "db": "name"}]}
+
+
+def _entry(path) -> LedgerEntry:
+    return LedgerEntry(str(path), "t", 10, 9, 1, 0.5, "2026-01-01T00:00:00+00:00")
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("名前\na\n", encoding="utf-8")
+    return path
+
+
+def test_find_recorded(tmp_path, csv_path):
+    table_hash = table_def_hash(CONFIG)
+    ledger = ImportLedger(tmp_path / "state" / "ledger.sqlite3")
+    assert ledger.find(csv_path, table_hash, DB_URL) is None
+
+    ledger.record(csv_path, table_hash, DB_URL, _entry(csv_path))
+
+    found = ImportLedger(ledger.path).find(csv_path, table_hash, DB_URL)
+    assert found == LedgerEntry(str(csv_path.resolve()), "t", 10, 9, 1, 0.5, "2026-01-01T00:00:00+00:00")
+    assert ImportLedger(ledger.path).find(csv_path, table_hash, DB_URL + "2") is None
+    assert ImportLedger(ledger.path).find(csv_path, table_def_hash({**CONFIG, "table": "u"}), DB_URL) is None
+
+
+def test_find_by_content(tmp_path, csv_path):
+    table_hash = table_def_hash(CONFIG)
+    ledger = ImportLedger(tmp_path / "ledger.sqlite3")
+    ledger.record(csv_path, table_hash, DB_URL, _entry(csv_path))
+
+    # コピーや touch されても内容が同じなら投入済み
+    copied = tmp_path / "copy.csv"
+    copied.write_bytes(csv_path.read_bytes())
+    os.utime(csv_path, ns=(0, 0))
+    assert ImportLedger(ledger.path).find(copied, table_hash, DB_URL) is not None
+    assert ImportLedger(ledger.path).find(csv_path, table_hash, DB_URL) is not None
+
+    csv_path.write_text("名前\nb\n", encoding="utf-8")
+    assert ImportLedger(ledger.path).find(csv_path, table_hash, DB_URL) is None
+
+
+def test_find_by_stat_skips_hashing(tmp_path, csv_path, monkeypatch):
+    table_hash = table_def_hash(CONFIG)
+    ImportLedger(tmp_path / "ledger.sqlite3").record(csv_path, table_hash, DB_URL, _entry(csv_path))
+
+    ledger = ImportLedger(tmp_path / "ledger.sqlite3")
+    monkeypatch.setattr(ledger, "content_hash", lambda filepath: pytest.fail("ファイルを読んだ"))
+    assert ledger.find(csv_path, table_hash, DB_URL) is not None
@@ -0,0 +1,262 @@
+"""loader のテスト（DBへは接続せず、送られた文を解釈して書き込み先を記録する偽物で確かめる）"""
+
+import re
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+from ansem_import import loader
+from ansem_import.loader import MissingSequence, load_batches, primary_key_sequence
+from ansem_import.tabledef import compile_table_def
+from ansem_import.transformer import transform_related, transform_rows
+
+TABLES_DIR = Path(__file__).resolve().parent.parent / "tables"
+
+_INSERT = re.compile(r"INSERT INTO (\w+) \(([^)]*)\)")
+_COPY = re.compile(r"COPY (\w+) \(([^)]*)\)")
+_RETURNING = re.compile(r"RETURNING (\w+)")
+
+
+class FakeCursor:
+    """INSERT / COPY で書かれた行をテーブルごとに記録するカーソル
+
+    主キーは RETURNING でも nextval でも同じ連番から採番する。
+    NULL はDEFAULTに置き換わったものとして記録しない（列を省略した場合と同じ）。
+    """
+
+    def __init__(self, sequence="m_influencers_influencer_id_seq", stored=()):
+        self.sequence = sequence
+        self.stored = list(stored)  # diff_only で返す既存行（natural_key..., 内容ハッシュ）
+        self.tables: dict[str, list[dict]] = {}
+        self.executed = []
+        self._next_id = 0
+        self._results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if "pg_get_serial_sequence" in sql:
+            self._results = [(self.sequence,)]
+        elif "generate_series" in sql:
+            self._results = [(self._take_id(),) for _ in range(params[1])]
+        elif "pg_attrdef" in sql:
+            self._results = []
+        elif "md5(" in sql:
+            self._results = list(self.stored)
+        elif sql.startswith("INSERT"):
+            self._insert(sql, params)
+
+    def executemany(self, sql, params_seq, returning=False):
+        self.executed.append((sql, params_seq))
+        for params in params_seq:
+            self._insert(sql, params)
+
+    def fetchone(self):
+        return self._results.pop(0)
+
+    def fetchall(self):
+        rows, self._results = self._results, []
+        return rows
+
+    def nextset(self):
+        return None
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @contextmanager
+    def copy(self, sql):
+        self.executed.append((sql, None))
+        table, cols = _COPY.match(sql).groups()
+        yield _FakeCopy(self, table, cols.split(", "))
+
+    def _insert(self, sql, params):
+        table, cols = _INSERT.match(sql).groups()
+        cols = cols.split(", ")
+        returning = _RETURNING.search(sql)
+        for i in range(0, len(params), len(cols)):
+            row = dict(zip(cols, params[i:i + len(cols)]))
+            if returning:
+                row[returning.group(1)] = self._take_id()
+                self._results.append((row[returning.group(1)],))
+            self._record(table, row)
+
+    def _record(self, table, row):
+        self.tables.setdefault(table, []).append({k: v for k, v in row.items() if v is not None})
+
+    def _take_id(self):
+        self._next_id += 1
+        return self._next_id
+
+
+class _FakeCopy:
+    def __init__(self, cursor, table, cols):
+        self._cursor = cursor
+        self._table = table
+        self._cols = cols
+
+    def write_row(self, row):
+        self._cursor._record(self._table, dict(zip(self._cols, row)))
+
+
+class FakeConnection:
+    def __init__(self, cursor=None):
+        self.cur = cursor or FakeCursor()
+        self.commits = 0
+
+    def cursor(self):
+        return self.cur
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture(scope="module")
+def config():
+    return compile_table_def(TABLES_DIR / "influencers.yaml").config
+
+
+@pytest.fixture(scope="module")
+def batches(config):
+    """3チャンク分の（親レコード, 関連テーブルのレコード）"""
+    rows = [
+        {
+            "マスター名": f"名前{i}",
+            "区分": ["事務所所属", "フリーランス", ""][i % 3],
+            "メールアドレス": f"user{i}@example.com" if i % 2 else "",
+            "Instagram": f"https://ig/{i}" if i % 2 else "",
+            "TikTok": f"https://tt/{i}" if i % 3 else "",
+            "銀行名": "みずほ" if i % 4 == 0 else "",
+            "口座番号": "1234567" if i % 4 == 0 else "",
+        }
+        for i in range(10)
+    ]
+    chunks = [rows[0:4], rows[4:8], rows[8:10]]
+    return [(transform_rows(chunk, config), transform_related(chunk, config)) for chunk in chunks]
+
+
+def _contents(cur) -> dict[str, list]:
+    """テーブルごとの行（順不同）。主キーは方式ごとに採番順が違うため、親の名前に置き換える"""
+    names = {r.get("influencer_id"): r["influencer_name"] for r in cur.tables["m_influencers"]}
+    return {
+        table: sorted(
+            sorted((k, names[v] if k == "influencer_id" else v) for k, v in row.items()) for row in rows
+        )
+        for table, rows in cur.tables.items()
+    }
+
+
+def _load(config, batches, mode, *, cursor=None, **kwargs):
+    conn = FakeConnection(cursor)
+    result = load_batches(iter(batches), config, "", mode, conn=conn, **kwargs)
+    return result, conn
+
+
+def test_primary_key_sequence():
+    cur = FakeCursor(sequence="public.m_influencers_influencer_id_seq")
+
+    assert primary_key_sequence(cur, "m_influencers", "influencer_id", "--load-mode copy") == (
+        "public.m_influencers_influencer_id_seq"
+    )
+    assert cur.executed[0][1] == ("m_influencers", "influencer_id")
+
+
+def test_primary_key_sequence_missing():
+    with pytest.raises(MissingSequence, match="--load-mode prepared"):
+        primary_key_sequence(FakeCursor(sequence=None), "m_influencers", "influencer_id", "--load-mode prepared")
+
+
+def test_copy_matches_insert(config, batches):
+    inserted, insert_conn = _load(config, batches, "insert")
+    copied, copy_conn = _load(config, batches, "copy")
+
+    assert inserted.count == copied.count == 10
+    assert _contents(copy_conn.cur) == _contents(insert_conn.cur)
+    assert all(sql.startswith("COPY") for sql, _ in copy_conn.cur.executed)
+    assert copied.round_trips < inserted.round_trips
+
+
+def test_copy_with_related_matches_insert(config, batches):
+    inserted, insert_conn = _load(config, batches, "insert", with_related=True)
+    copied, copy_conn = _load(config, batches, "copy", with_related=True)
+
+    assert copied.related == inserted.related == {"t_influencer_sns_accounts": 11, "t_bank_accounts": 3}
+    contents = _contents(copy_conn.cur)
+    assert contents == _contents(insert_conn.cur)
+    # 関連テーブルは親の主キーでつながる
+    assert [("account_url", "https://ig/1"), ("influencer_id", "名前1"), ("platform_id", 1)] in (
+        contents["t_influencer_sns_accounts"]
+    )
+    assert [("account_url", "https://tt/2"), ("influencer_id", "名前2"), ("platform_id", 4)] in (
+        contents["t_influencer_sns_accounts"]
+    )
+
+
+@pytest.mark.parametrize("with_related", [False, True])
+def test_prepared_matches_insert(config, batches, monkeypatch, with_related):
+    monkeypatch.setattr(loader, "PREPARED_BATCH_ROWS", 3)  # 3行の文と端数の1行の文の両方を通す
+    inserted, insert_conn = _load(config, batches, "insert", with_related=with_related)
+    prepared, prepared_conn = _load(config, batches, "prepared", with_related=with_related)
+
+    assert (prepared.count, prepared.related) == (inserted.count, inserted.related)
+    assert _contents(prepared_conn.cur) == _contents(insert_conn.cur)
+    if not with_related:
+        assert prepared.round_trips < inserted.round_trips
+
+    # 文の形はテーブルごとに「3行」と「1行」の2つだけ（自動プリペアで使い回される）
+    shapes = {}
+    for sql, _ in prepared_conn.cur.executed:
+        if sql.startswith("INSERT"):
+            shapes.setdefault(_INSERT.match(sql).group(1), set()).add(sql.count("VALUES (") + sql.count("), ("))
+    assert shapes["m_influencers"] == {3, 1}
+    assert all(counts <= {3, 1} for counts in shapes.values())
+    if with_related:
+        head = next(sql for sql, _ in prepared_conn.cur.executed if sql.startswith("INSERT INTO m_influencers"))
+        assert "OVERRIDING SYSTEM VALUE" in head
+
+
+def test_upsert_matches_insert(config, batches):
+    inserted, insert_conn = _load(config, batches, "insert")
+    upserted, upsert_conn = _load(config, batches, "upsert")
+
+    assert upserted.count == inserted.count == 10
+    assert _contents(upsert_conn.cur) == _contents(insert_conn.cur)
+    assert all(" ON CONFLICT (influencer_name) DO " in sql for sql, _ in upsert_conn.cur.executed)
+
+
+def test_upsert_diff_only_skips_unchanged(config, batches):
+    records = [r for chunk, _ in batches for r in chunk]
+    stored = [
+        # 名前0 は同じ内容、名前1 はメールアドレスが違う
+        (records[0]["influencer_name"], _stored_hash(config, records[0])),
+        (records[1]["influencer_name"], _stored_hash(config, {**records[1], "email_address": "old@example.com"})),
+    ]
+
+    result, conn = _load(config, batches, "upsert", cursor=FakeCursor(stored=stored), diff_only=True)
+
+    assert (result.count, result.skipped) == (9, 1)
+    assert "名前0" not in {r["influencer_name"] for r in conn.cur.tables["m_influencers"]}
+
+
+def _stored_hash(config, record) -> str:
+    """DB側の _fetch_row_hashes と同じ形の内容ハッシュ"""
+    return "".join(loader._cell_hash(record.get(c["db"])) for c in config["columns"])
+
+
+def test_commit_every_calls_on_commit(config, batches):
+    committed = []
+
+    result, conn = _load(
+        config, batches, "copy", commit_every=5, on_commit=lambda r: committed.append(r.count),
+    )
+
+    # チャンク境界（4行 → 8行）で1回、最後に1回
+    assert committed == [8, 10]
+    assert conn.commits == 2
+    assert result.count == 10
@@ -0,0 +1,109 @@
+"""lookup のテスト（マスタへの問い合わせは _fetch を差し替えて数える）"""
+
+import json
+import time
+
+import pytest
+
+from ansem_import.lookup import LookupResolver, lookup_columns, lookup_names
+
+DB_URL = "postgresql://localhost/test"
+MASTER = {"日本": 1, "米国": 2, "英国": 3}
+
+CONFIG = {
+    "table": "t",
+    "columns": [
+        {"csv": "名前", "db": "name"},
+        {"csv": "国", "db": "country_id", "type": "lookup",
+         "lookup": {"table": "m_countries", "key": "country_name", "value": "country_id"}},
+    ],
+    "related_tables": [
+        {"table": "r", "foreign_key": "t_id", "columns": [
+            {"csv": "発送先の国", "db": "country_id", "type": "lookup",
+             "lookup": {"table": "m_countries", "key": "country_name", "value": "country_id"}},
+        ]},
+    ],
+}
+HEADER = {"名前": 0, "国": 1, "発送先の国": 2}
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """_fetch に渡された名前の集合を問い合わせごとに記録する"""
+    calls = []
+
+    def fetch(self, spec, names):
+        calls.append(set(names))
+        self.queries += 1
+        return {name: MASTER[name] for name in names if name in MASTER}
+
+    monkeypatch.setattr(LookupResolver, "_fetch", fetch)
+    return calls
+
+
+def test_lookup_columns_and_names():
+    assert [(table, [db for db, _ in specs]) for table, specs in lookup_columns(CONFIG).items()] == [
+        ("t", ["country_id"]), ("r", ["country_id"]),
+    ]
+    rows = [("a", " 日本 ", ""), ("b", "", "米国")]
+    assert lookup_names(rows, HEADER, [c for c in CONFIG["columns"] if c.get("type") == "lookup"]) == [
+        ["日本", None],
+    ]
+
+
+def test_check_fetches_each_name_once(fetched):
+    lookups = LookupResolver(CONFIG, DB_URL)
+
+    failed, errors = lookups.check([["日本", "火星", None], ["米国", "日本", "火星"]], [2, 3, 4])
+    assert failed == [1, 2]
+    assert [(e["row"], e["column"], e["message"]) for e in errors] == [
+        (3, "国", "m_countries.country_name に存在しない値: 火星"),
+        (4, "発送先の国", "m_countries.country_name に存在しない値: 火星"),
+    ]
+    assert errors[0]["check"] == "m_countries.country_name に存在しない値: …"
+
+    # 取得済みの名前とマスタになかった名前は引き直さない
+    lookups.check([["日本", "火星"], ["英国", "米国"]], [5, 6])
+    assert fetched == [{"日本", "火星"}, {"米国"}, {"英国"}]
+    assert lookups.queries == 3
+
+
+def test_resolve_replaces_names(fetched):
+    lookups = LookupResolver(CONFIG, DB_URL)
+    lookups.check([["日本", None], [None, "英国"]], [2, 3])
+    records = [{"name": "a", "country_id": "日本"}, {"name": "b", "country_id": None}]
+    related = {"r": [(1, {"country_id": "英国"})]}
+
+    lookups.resolve(records, related)
+
+    assert records == [{"name": "a", "country_id": 1}, {"name": "b", "country_id": None}]
+    assert related == {"r": [(1, {"country_id": 3})]}
+
+
+def test_disk_cache_ttl(fetched, tmp_path, monkeypatch):
+    lookups = LookupResolver(CONFIG, DB_URL, tmp_path, ttl=60)
+    lookups.check([["日本"], [None]], [2])
+    lookups.close()
+    [path] = tmp_path.glob("m_countries.country_name.country_id.*.json")
+    fetched_at = json.loads(path.read_text(encoding="utf-8"))["fetched_at"]
+
+    # TTL内はディスクから読み、追記しても取得時刻は元のまま
+    lookups = LookupResolver(CONFIG, DB_URL, tmp_path, ttl=60)
+    lookups.check([["日本", "米国"], [None, None]], [2, 3])
+    lookups.close()
+    assert fetched == [{"日本"}, {"米国"}]
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data == {"fetched_at": fetched_at, "mapping": {"日本": 1, "米国": 2}}
+
+    # 接続先が違えば別のキャッシュ
+    LookupResolver(CONFIG, DB_URL + "2", tmp_path, ttl=60).check([["日本"], [None]], [2])
+    assert fetched[-1] == {"日本"}
+
+    # TTLを過ぎたら引き直す
+    now = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: now)
+    lookups = LookupResolver(CONFIG, DB_URL, tmp_path, ttl=60)
+    lookups.check([["日本"], [None]], [2])
+    assert len(fetched) == 4
+    lookups.close()
+    assert json.loads(path.read_text(encoding="utf-8"))["fetched_at"] == now
@@ -0,0 +1,102 @@
+"""reader の文字コード判定・改行の扱いのテスト（open() の既定で読んだ csv.reader と同じ結果になること）"""
+
+import csv
+
+import pytest
+
+from ansem_import import reader
+from ansem_import.reader import detect_encoding, read_rows, row_getter
+
+HEADER = "名前,メモ,番号"
+ROWS = ['山田,"一行目{nl}二行目",001', "佐藤,,002", '"鈴木, 次郎","""引用""",003']
+
+
+def _write(path, newline: str, encoding: str = "utf-8", bom: bool = False) -> None:
+    lines = [HEADER] + [row.format(nl=newline) for row in ROWS]
+    data = (newline.join(lines) + newline).encode(encoding)
+    path.write_bytes((b"\xef\xbb\xbf" if bom else b"") + data)
+
+
+def _baseline(path, encoding: str) -> list[tuple[str, ...]]:
+    with open(path, encoding=encoding) as f:
+        return [tuple(row) for row in csv.reader(f) if row]
+
+
+def _read_all(path, chunk_size: int = 2, **kwargs) -> tuple[list[int], list[tuple[str, ...]], dict]:
+    starts, rows, header = [], [], None
+    for row_num, chunk, header in read_rows(path, chunk_size, **kwargs):
+        starts.append(row_num)
+        rows.extend(chunk)
+    return starts, rows, header
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"], ids=["LF", "CRLF", "CR"])
+def test_newlines_match_open(tmp_path, newline):
+    path = tmp_path / "data.csv"
+    _write(path, newline)
+
+    starts, rows, header = _read_all(path)
+
+    expected = _baseline(path, "utf-8")
+    assert header == {name: i for i, name in enumerate(expected[0])}
+    assert rows == expected[1:]
+    assert rows[0][1] == "一行目\n二行目"
+    assert starts == [2, 4]
+
+
+@pytest.mark.parametrize("newline", ["\r\n", "\r"], ids=["CRLF", "CR"])
+@pytest.mark.parametrize("block_size", [1, 2, 3, 7])
+def test_newlines_across_blocks(tmp_path, monkeypatch, newline, block_size):
+    monkeypatch.setattr(reader, "_BLOCK_SIZE", block_size)
+    path = tmp_path / "data.csv"
+    _write(path, newline)
+
+    _, rows, _ = _read_all(path)
+
+    assert rows == _baseline(path, "utf-8")[1:]
+
+
+@pytest.mark.parametrize(
+    ("encoding", "bom", "expected"),
+    [("utf-8", False, "utf-8"), ("utf-8", True, "utf-8-sig"), ("cp932", False, "cp932")],
+)
+def test_detect_encoding(tmp_path, encoding, bom, expected):
+    path = tmp_path / "data.csv"
+    _write(path, "\r\n", encoding, bom)
+
+    assert detect_encoding(path.read_bytes()) == expected
+    _, rows, header = _read_all(path)
+    assert list(header) == HEADER.split(",")
+    assert rows == _baseline(path, expected)[1:]
+
+
+def test_detect_encoding_ascii_prefix():
+    # 先頭が長くASCIIだけでも、最初の非ASCII部分から判定する
+    assert detect_encoding(b"a," * 100_000 + "氏名".encode("cp932")) == "cp932"
+    assert detect_encoding(b"a," * 100_000 + "氏名".encode("utf-8")) == "utf-8"
+    assert detect_encoding(b"id,name\n") == "utf-8"
+
+
+def test_skip_rows_and_padding(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("a,b,c\n1,2,3\n\n4,5\n6,7,8\n", encoding="utf-8")
+
+    starts, rows, _ = _read_all(path, chunk_size=10, skip_rows=1)
+
+    assert starts == [3]
+    assert rows == [("4", "5", ""), ("6", "7", "8")]
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_bytes(b"")
+
+    assert list(read_rows(path, 10)) == []
+
+
+def test_row_getter():
+    header = {"a": 0, "b": 1}
+    assert row_getter(header, ["b"])(("1", "2")) == ("2",)
+    assert row_getter(header, ["b", "a"])(("1", "2")) == ("2", "1")
+    assert row_getter(header, ["a", "x"])(("1", "2")) == ("1", "")
+    assert row_getter(None, ["a", "x"])({"a": "1"}) == ("1", "")
@@ -0,0 +1,69 @@
+"""起動時間の予算テスト（ansem_import.cli の import で重いモジュールを読まないこと）"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+# ansem_import.cli の import にかける時間の上限（マイクロ秒、click自体の読み込みを含む）
+IMPORT_BUDGET_US = 150_000
+
+# --help / --version では読み込まないモジュール
+DEFERRED_MODULES = {
+    "yaml",
+    "psycopg",
+    "csv",
+    "concurrent.futures",
+    "ansem_import.pipeline",
+    "ansem_import.loader",
+    "ansem_import.validator",
+    "ansem_import.tabledef",
+}
+
+
+def _importtime(code: str) -> dict[str, int]:
+    """python -X importtime の出力を {モジュール名: 累積マイクロ秒} にする"""
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR)}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, rest = line.partition(":")
+        _, cum, name = (part.strip() for part in rest.split("|"))
+        cumulative[name] = int(cum)
+    return cumulative
+
+
+def test_cli_import_defers_heavy_modules():
+    imported = _importtime("import ansem_import.cli")
+    assert not DEFERRED_MODULES & imported.keys()
+
+
+def test_cli_import_within_budget():
+    # 1回目はバイトコード生成分が乗るため、2回目を測る
+    _importtime("import ansem_import.cli")
+    imported = _importtime("import ansem_import.cli")
+    assert imported["ansem_import.cli"] < IMPORT_BUDGET_US
+
+
+def test_version_does_not_load_commands():
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR)}
+    proc = subprocess.run(
+        [sys.executable, "-c",
+         "import sys\n"
+         "from ansem_import.cli import main\n"
+         "try:\n"
+         "    main(['--version'])\n"
+         "except SystemExit:\n"
+         "    pass\n"
+         "print('loaded:', *sorted(m for m in sys.modules if m.split('.')[0] in ('yaml', 'psycopg', 'csv')))"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    assert ", version " in proc.stdout
+    assert proc.stdout.splitlines()[-1] == "loaded:"
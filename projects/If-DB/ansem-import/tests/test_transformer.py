@@ -0,0 +1,64 @@
+"""transformer のテスト（親レコードの変換と、関連テーブルの (親行インデックス, レコード)）"""
+
+from pathlib import Path
+
+import pytest
+
+from ansem_import.tabledef import compile_table_def
+from ansem_import.transformer import transform_related, transform_rows
+
+TABLES_DIR = Path(__file__).resolve().parent.parent / "tables"
+
+
+@pytest.fixture(scope="module")
+def config():
+    return compile_table_def(TABLES_DIR / "influencers.yaml").config
+
+
+def _row(**values) -> dict:
+    return {"マスター名": "山田", **values}
+
+
+def test_transform_rows(config):
+    records = transform_rows(
+        [_row(区分="フリーランス", コンプラチェック="○", メールアドレス=" a@b.c "), _row(コンプラチェック="×")], config
+    )
+
+    assert records[0] == {
+        "influencer_name": "山田",
+        "affiliation_type_id": 2,
+        "compliance_check": True,
+        "affiliation_name": None,
+        "honorific": None,
+        "email_address": "a@b.c",
+    }
+    assert records[1]["compliance_check"] is False
+
+
+def test_transform_related_parent_index(config):
+    rows = [
+        _row(Instagram="https://ig/a", TikTok="https://tt/a", 銀行名="みずほ", 口座種別="普通", 口座番号="1234567"),
+        _row(),
+        _row(YouTube=" https://yt/c ", 郵便番号="100-0001"),
+    ]
+
+    related = transform_related(rows, config)
+
+    assert related == {
+        "t_influencer_sns_accounts": [
+            (0, {"account_url": "https://ig/a", "platform_id": 1}),
+            (0, {"account_url": "https://tt/a", "platform_id": 4}),
+            (2, {"account_url": "https://yt/c", "platform_id": 2}),
+        ],
+        "t_bank_accounts": [(0, {"bank_name": "みずほ", "account_type": 1, "account_number": "1234567"})],
+        "t_addresses": [(2, {"postal_code": "100-0001"})],
+    }
+
+
+def test_transform_related_tuple_rows_match_dicts(config):
+    rows = [_row(Instagram="https://ig/a", 請求先名="株式会社A"), _row(口座名義="ヤマダ")]
+    names = list(dict.fromkeys(k for row in rows for k in row))
+    header = {name: i for i, name in enumerate(names)}
+    tuples = [tuple(row.get(n, "") for n in names) for row in rows]
+
+    assert transform_related(tuples, config, header) == transform_related(rows, config)
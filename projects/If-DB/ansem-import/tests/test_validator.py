@@ -0,0 +1,102 @@
+"""validator のテスト（コンパイル済みプランと列単位の検査）"""
+
+from pathlib import Path
+
+import pytest
+
+from ansem_import.tabledef import compile_table_def
+from ansem_import.validator import column_failures, compile_plan, validate_csv
+
+TABLES_DIR = Path(__file__).resolve().parent.parent / "tables"
+
+CONFIG = {
+    "table": "t",
+    "columns": [
+        {"csv": "名前", "db": "name", "required": True},
+        {"csv": "備考", "db": "note"},
+        {"csv": "区分", "db": "kind", "type": "dropdown", "mapping": {"甲": 1, "乙": 2}},
+        {"csv": "メール", "db": "email", "format": "email"},
+    ],
+    "related_tables": [
+        {"table": "r", "foreign_key": "t_id", "columns": [{"csv": "口座番号", "db": "number", "format": "digits:3"}]},
+    ],
+}
+NAMES = ["名前", "備考", "区分", "メール", "口座番号"]
+HEADER = {name: i for i, name in enumerate(NAMES)}
+
+
+@pytest.fixture(scope="module")
+def influencers():
+    return compile_table_def(TABLES_DIR / "influencers.yaml").config
+
+
+def test_compile_plan_skips_unchecked_columns(influencers):
+    plan = compile_plan(influencers)
+
+    assert [rule.csv for rule in plan] == ["マスター名", "区分", "様/御中", "メールアドレス", "口座種別", "口座番号"]
+    assert [rule.required for rule in plan] == [True, False, False, False, False, False]
+    assert all(len(rule.checks) == len(rule.masks) for rule in plan)
+
+
+def test_validate_csv_errors_in_row_and_column_order():
+    rows = [
+        ("山田", "", "甲", "a@b.c", "123"),
+        ("", "x", "丙", "bad", "12"),
+        (" 佐藤 ", "", "", "", ""),
+        ("鈴木", "", "乙", "a@b", "１２３"),  # 全角数字は \d と同じく数字として通す
+    ]
+
+    valid, errors = validate_csv(rows, CONFIG, start_row=10, header=HEADER)
+
+    # 値は strip してから検査し、正常行は元のタプルのまま返す
+    assert valid == [rows[0], rows[2]]
+    assert [(e["row"], e["column"], e["value"]) for e in errors] == [
+        (11, "名前", ""),
+        (11, "区分", "丙"),
+        (11, "メール", "bad"),
+        (11, "口座番号", "12"),
+        (13, "メール", "a@b"),
+    ]
+    assert errors[0]["message"] == "必須項目「名前」が空です"
+    assert errors[1]["message"] == "「区分」の値が不正: 丙（有効値: 甲, 乙）"
+    assert errors[1]["check"] == "「区分」の値が不正: …（有効値: 甲, 乙）"
+    assert errors[3]["message"] == "口座番号は3桁の数字が必要: 12"
+
+
+def test_validate_csv_dict_rows_match_tuples():
+    rows = [("山田", "", "丙", "a@b.c", "1234"), ("", "", "甲", "", "")]
+    dict_rows = [dict(zip(NAMES, row)) for row in rows]
+
+    valid, errors = validate_csv(rows, CONFIG, header=HEADER)
+    dict_valid, dict_errors = validate_csv(dict_rows, CONFIG, plan=compile_plan(CONFIG))
+
+    assert dict_errors == errors
+    assert dict_valid == [dict(zip(NAMES, row)) for row in valid] == []
+
+
+def test_validate_csv_empty():
+    assert validate_csv([], CONFIG, header=HEADER) == ([], [])
+    assert validate_csv([("a",)], {"table": "t", "columns": [{"csv": "a", "db": "a"}]}, header={"a": 0}) == (
+        [("a",)], []
+    )
+
+
+# 列単位のマスクが、行単位の検査関数と同じ値をエラーにすること
+TRICKY = [
+    "a@b.c", "a@b", "a b@c.d", "a@b.c\u3000", "a\x0b@b.c", "a\x85@b.c", "ａ@例え.日本", "@b.c", "a@@b.c",
+    "123", "１２３", "١٢٣", "12", "1234", "12a", "¹²³", "甲", "乙", "丙", "甲 ",
+]
+
+
+def test_masks_match_checks():
+    for rule in compile_plan(CONFIG):
+        for mask_fn, check in zip(rule.masks, rule.checks):
+            assert list(mask_fn(TRICKY)) == [check(v) is not None for v in TRICKY], rule.csv
+
+
+def test_column_failures_ignores_empty_values():
+    email, = (rule for rule in compile_plan(CONFIG) if rule.csv == "メール")
+    name, = (rule for rule in compile_plan(CONFIG) if rule.csv == "名前")
+
+    assert column_failures(email, ["", "bad", "a@b.c"]) == b"\x00\x01\x00"
+    assert column_failures(name, ["", "x"]) == b"\x01\x00"